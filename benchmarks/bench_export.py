@@ -0,0 +1,65 @@
+"""Times loading the nutrient table from the JSONL dump and from the columnar exports.
+
+Writes a synthetic dump and its exports to a temporary directory and
+checks that every format round-trips to the same table.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_loader import synthetic_foods
+from columnar_export import export_table, load_table, pa, table_from_file
+
+TOTAL_FOODS = 5500
+
+
+def best_of(function, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def same_table(a, b):
+    return (a.codes == b.codes and a.names == b.names and a.groups == b.groups
+            and a.descriptions == b.descriptions and a.columns == b.columns
+            and np.array_equal(np.asarray(a.values), np.asarray(b.values), equal_nan=True))
+
+
+def run():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "foods.txt")
+        with open(path, "w", encoding='utf-8') as file:
+            for food_json in synthetic_foods(TOTAL_FOODS):
+                file.write(json.dumps(food_json, ensure_ascii=False) + "\n")
+
+        elapsed, table = best_of(lambda: table_from_file(path), repeat=1)
+        print(f"{'JSONL parse':>16}: {elapsed * 1000:8.1f} ms  ({len(table)} x {len(table.columns)})")
+
+        npy_dir = os.path.join(directory, "npy")
+        parquet_dir = os.path.join(directory, "parquet")
+        export_table(table, npy_dir, ("npy",))
+        loaders = [("npy (mmap)", lambda: load_table(npy_dir)),
+                   ("npy (read)", lambda: load_table(npy_dir, mmap=False))]
+        if pa is not None:
+            export_table(table, parquet_dir, ("parquet",))
+            loaders.append(("parquet", lambda: load_table(parquet_dir)))
+        else:
+            print("pyarrow is not installed, skipping Parquet")
+
+        for name, loader in loaders:
+            elapsed, loaded = best_of(loader)
+            status = "ok" if same_table(table, loaded) else "MISMATCH"
+            print(f"{name:>16}: {elapsed * 1000:8.1f} ms  round trip {status}")
+
+
+if __name__ == "__main__":
+    run()
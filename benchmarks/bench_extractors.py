@@ -0,0 +1,101 @@
+"""Checks that every HTML extractor matches html.parser and times parse cost per page.
+
+Usage: python bench_extractors.py [corpus_dir]
+
+corpus_dir may hold saved TBCA pages: detail pages as <food_code>.html and
+listing pages as listing_<n>.html (or listing-<n>.html, as written by
+mock_tbca_server.save_pages), e.g. tests/corpus. Without it, pages
+rendered by the stand-in server plus a few malformed edge cases are used.
+tests/test_extractors.py runs the same parity check on both.
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import render_detail_page, render_listing_page, food_code
+from extractors import EXTRACTORS
+
+EDGE_CASES = [
+    "",
+    "<html><body><p>No table here</p></body></html>",
+    "<html><head><title> Only a title </title></head><body></body></html>",
+    "<h2></h2><h1>Heading <b>one</b></h1><table><tr><th>x</th></tr></table>",
+    "<h2>Leite, c/ açúcar &amp; cacau&nbsp;</h2><table><tbody><tr><th>C</th></tr>"
+    "<tr><td> Sódio <!-- note --></td><td>mg</td><td>1,5</td><td>extra</td></tr>"
+    "<tr><td>Cálcio</td><td>mg</td></tr></tbody></table><table><tr><td>a</td><td>b</td><td>c</td></tr></table>",
+    "<table><tr><th>x</th></tr><tr><td><table><tr><td>n1</td><td>n2</td><td>n3</td></tr></table></td>"
+    "<td>g</td><td>2</td></tr></table>",
+]
+LISTING_EDGE_CASES = [
+    "<table><tr><td><a href='int_composicao_alimentos.php?cod_produto=X1&x=1'>X1</a></td>"
+    "<td>n</td><td>s</td><td> Frutas </td></tr></table><a href='?page=2'><span>próxima »</span></a>",
+    "<a href='?page=abc'>1</a><a>próxima  »</a>",
+]
+
+
+def load_corpus(corpus_dir):
+    details, listings = [], []
+    if corpus_dir:
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+            with open(path, "rb") as file:
+                content = file.read()
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name.startswith(("listing_", "listing-")):
+                listings.append(content)
+            else:
+                details.append((name, content))
+    else:
+        details = [(food_code(i), render_detail_page(food_code(i)).encode("utf-8")) for i in range(300)]
+        details += [(f"EDGE{i}", page.encode("utf-8")) for i, page in enumerate(EDGE_CASES)]
+        listings = [render_listing_page(page, 50, 5500).encode("utf-8") for page in (1, 50, 110)]
+        listings += [page.encode("utf-8") for page in LISTING_EDGE_CASES]
+    return details, listings
+
+
+def check_parity(extractors, details, listings):
+    reference = extractors["html.parser"]
+    mismatches = 0
+    for name, extractor in extractors.items():
+        for code, content in details:
+            expected = reference.parse_food_page(content, code, "class")
+            if extractor.parse_food_page(content, code, "class") != expected:
+                mismatches += 1
+                print(f"MISMATCH {name} detail page {code}")
+        for index, content in enumerate(listings):
+            if extractor.parse_listing_page(content) != reference.parse_listing_page(content):
+                mismatches += 1
+                print(f"MISMATCH {name} listing page #{index}")
+    return mismatches
+
+
+def time_extractor(extractor, details, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for code, content in details:
+            extractor.parse_food_page(content, code, "class")
+        best = min(best, time.perf_counter() - started)
+    return best / len(details)
+
+
+def run(corpus_dir=None):
+    extractors = {}
+    for name, extractor_class in EXTRACTORS.items():
+        try:
+            extractors[name] = extractor_class()
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+    details, listings = load_corpus(corpus_dir)
+    mismatches = check_parity(extractors, details, listings)
+    print(f"Parity: {len(details)} detail pages, {len(listings)} listing pages, {mismatches} mismatches")
+    for name, extractor in extractors.items():
+        per_page = time_extractor(extractor, details)
+        print(f"{name:>12}: {per_page * 1e6:8.1f} us/page  ({1 / per_page:8.0f} pages/s)")
+    return mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run(sys.argv[1] if len(sys.argv) > 1 else None) else 0)
@@ -0,0 +1,42 @@
+"""Measures detail pages/second of the concurrent fetcher at several worker counts"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import MockTBCAServer, food_code
+from extractors import get_extractor
+from fetcher import HTTPClient, fetch_concurrently
+from webscraping import fetch_food
+
+TOTAL_FOODS = 640
+LATENCY = 0.05
+WORKER_COUNTS = [1, 8, 32, 64]
+
+
+def run():
+    with MockTBCAServer(total_foods=TOTAL_FOODS, latency=LATENCY) as server:
+        items = [(food_code(i), "Frutas e derivados") for i in range(TOTAL_FOODS)]
+        extractor = get_extractor()
+        for workers in WORKER_COUNTS:
+            client = HTTPClient(pool_size=workers)
+            started = time.perf_counter()
+            errors = 0
+            for _, _, error in fetch_concurrently(
+                items,
+                lambda item: fetch_food(client, extractor, item[0], item[1], server.base_url),
+                workers=workers,
+                ordered=False
+            ):
+                errors += error is not None
+            elapsed = time.perf_counter() - started
+            stats = client.stats()
+            client.close()
+            print(f"workers={workers:>3}  {TOTAL_FOODS / elapsed:8.1f} pages/s  "
+                  f"({elapsed:.2f}s, {errors} errors, {stats['connections_opened']} connections opened, "
+                  f"{stats['connections_reused']} reused)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,123 @@
+"""Compares per-row save_to_db with the batched COPY loader on a local PostgreSQL.
+
+Uses the DB_* environment variables and works inside a throwaway schema,
+so the tables of the configured database are left untouched.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import CLASSES, food_code
+from bulk_loader import BulkLoader
+from dbconnect import postgresql_connection
+from nutrients import COLUMNS, NUTRIENTS
+from webscraping import TBCAProcessor
+
+TOTAL_FOODS = 2000
+BENCH_SCHEMA = "bench_loader"
+
+SCHEMA_SQL = """
+CREATE TABLE foods (
+    id SERIAL PRIMARY KEY,
+    code VARCHAR(15) UNIQUE NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    "group" VARCHAR(255) NOT NULL,
+    content_hash VARCHAR(64)
+);
+CREATE TABLE food_variations (
+    id SERIAL PRIMARY KEY,
+    food_id INTEGER REFERENCES foods(id),
+    description TEXT
+);
+CREATE TABLE food_nutrients (
+    id SERIAL PRIMARY KEY,
+    variation_id INTEGER REFERENCES food_variations(id),
+    component VARCHAR(500),
+    unit_of_measurement VARCHAR(100),
+    value_per_100g VARCHAR(100)
+);
+CREATE TABLE food_variation_nutrients (
+    id SERIAL PRIMARY KEY,
+    variation_id INTEGER REFERENCES food_variations(id),
+    {columns}
+);
+"""
+
+
+def synthetic_foods(count):
+    foods = []
+    for index in range(count):
+        foods.append({
+            'code': food_code(index),
+            'class': CLASSES[index % len(CLASSES)],
+            'description': f"Alimento {index}, cozido, s/ sal",
+            'nutrients': [
+                {'Component': nutrient['name'], 'Units': nutrient['unit'],
+                 'Value per 100g': "NA" if (index + position) % 7 == 0 else f"{(index * position) % 300},{position}"}
+                for position, nutrient in enumerate(NUTRIENTS)
+            ]
+        })
+    return foods
+
+
+def reset_schema(conn, schema=BENCH_SCHEMA):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"SET search_path TO {schema}")
+        cursor.execute(SCHEMA_SQL.format(columns=",\n    ".join(f"{column} DECIMAL(10,2)" for column in COLUMNS)))
+    conn.commit()
+
+
+def count_rows(conn):
+    with conn.cursor() as cursor:
+        counts = []
+        for table in ("foods", "food_variations", "food_nutrients", "food_variation_nutrients"):
+            cursor.execute(f"SELECT count(*) FROM {table}")
+            counts.append(cursor.fetchone()[0])
+    return counts
+
+
+def per_row(conn, processor, foods):
+    cursor = conn.cursor()
+    for i, food_json in enumerate(foods):
+        processor.save_to_db(cursor, food_json)
+        if (i + 1) % 10 == 0:
+            conn.commit()
+    conn.commit()
+    cursor.close()
+
+
+def batched(conn, processor, foods, batch_size=500):
+    loader = BulkLoader(conn, processor, batch_size)
+    for food_json in foods:
+        loader.add(food_json)
+    loader.flush()
+
+
+def run():
+    processor = TBCAProcessor()
+    foods = synthetic_foods(TOTAL_FOODS)
+    conn = postgresql_connection()
+    try:
+        for name, load in (("per-row save_to_db", per_row), ("batched COPY loader", batched)):
+            for label in ("first load", "reload"):
+                if label == "first load":
+                    reset_schema(conn)
+                started = time.perf_counter()
+                load(conn, processor, foods)
+                elapsed = time.perf_counter() - started
+                counts = count_rows(conn)
+                print(f"{name:>20} {label:>10}: {sum(counts) / elapsed:10.0f} rows/s  "
+                      f"{TOTAL_FOODS / elapsed:8.0f} foods/s  ({elapsed:.2f}s, rows per table {counts})")
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,65 @@
+"""Measures foods/second through nutrient normalization alone, without any I/O.
+
+Compares nutrients.normalize with the per-call dict and SQL building that
+save_to_db used to do for every food.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_loader import synthetic_foods
+from nutrients import COLUMNS, INSERT_VARIATION_NUTRIENTS, NUTRIENTS, normalize
+
+TOTAL_FOODS = 5500
+
+
+def previous_normalize(nutrients):
+    """The former extract_nutrients plus the dynamic INSERT of save_to_db"""
+    # The mapping was rebuilt per food, and Energia was resolved by stringifying the whole list
+    nutrient_column_map = {nutrient["name"]: nutrient["column"] for nutrient in NUTRIENTS}
+    nutrient_column_map["Energia"] = "energia_kj" if "kJ" in str(nutrients) else "energia_kcal"
+    nutrient_values = {}
+    legacy_rows = []
+    for nutrient in nutrients:
+        component = nutrient.get('Component', '')[:499]
+        unit = nutrient.get('Units', '')[:99]
+        value = nutrient.get('Value per 100g', '')[:99]
+        legacy_rows.append((component, unit, value))
+        column_name = nutrient_column_map.get(component)
+        if column_name:
+            try:
+                numeric_value = float(value.replace(',', '.')) if value and value not in ("NA", "") else None
+            except (ValueError, AttributeError):
+                numeric_value = None
+            nutrient_values[column_name] = numeric_value
+    columns = ["variation_id"] + list(nutrient_values.keys())
+    query = f"INSERT INTO food_variation_nutrients ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    return legacy_rows, query, [0] + list(nutrient_values.values())
+
+
+def current_normalize(nutrients):
+    legacy_rows, values = normalize(nutrients)
+    return legacy_rows, INSERT_VARIATION_NUTRIENTS, [0] + values
+
+
+def time_normalizer(normalizer, foods, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for food_json in foods:
+            normalizer(food_json['nutrients'])
+        best = min(best, time.perf_counter() - started)
+    return len(foods) / best
+
+
+def run():
+    foods = synthetic_foods(TOTAL_FOODS)
+    print(f"{TOTAL_FOODS} foods x {len(COLUMNS)} nutrients")
+    for name, normalizer in (("previous", previous_normalize), ("normalize", current_normalize)):
+        print(f"{name:>10}: {time_normalizer(normalizer, foods):10.0f} foods/s")
+
+
+if __name__ == "__main__":
+    run()
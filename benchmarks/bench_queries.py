@@ -0,0 +1,130 @@
+"""Checks the in-process query engine against example_queries.sql and compares latencies.
+
+Loads synthetic foods into a throwaway schema of the database configured by
+the DB_* environment variables. The SQL below is example_queries.sql with
+ties broken by food code (and names compared with COLLATE "C") so both
+sides return rows in the same order.
+"""
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_loader import BENCH_SCHEMA, batched, reset_schema, synthetic_foods
+from dbconnect import postgresql_connection
+from nutrient_queries import load_queries
+from webscraping import TBCAProcessor
+
+TOTAL_FOODS = 5500
+REPEAT = 20
+
+JOINS = """
+    FROM foods f
+    JOIN food_variations fv ON f.id = fv.food_id
+    JOIN food_variation_nutrients fvn ON fv.id = fvn.variation_id
+"""
+
+QUERIES = [
+    ("2. top protein", lambda engine: engine.top('proteina_g', 10), f"""
+        SELECT f.name, f."group", fvn.proteina_g {JOINS}
+        WHERE fvn.proteina_g IS NOT NULL
+        ORDER BY fvn.proteina_g DESC, f.code LIMIT 10"""),
+    ("3. vitamin C, low fat", lambda engine: engine.high_vitamin_c_low_fat(), f"""
+        SELECT f.name, f."group", fvn.vitamina_c_mg, fvn.lipidios_g {JOINS}
+        WHERE fvn.vitamina_c_mg > 50 AND fvn.lipidios_g < 3
+        ORDER BY fvn.vitamina_c_mg DESC, f.code"""),
+    ("4. energy distribution", lambda engine: engine.energy_distribution(), f"""
+        SELECT f.name, f."group", fvn.energia_kcal, fvn.proteina_g, fvn.carboidrato_total_g, fvn.lipidios_g,
+            ROUND((fvn.proteina_g * 4 * 100) / NULLIF(fvn.energia_kcal, 0), 1),
+            ROUND((fvn.carboidrato_total_g * 4 * 100) / NULLIF(fvn.energia_kcal, 0), 1),
+            ROUND((fvn.lipidios_g * 9 * 100) / NULLIF(fvn.energia_kcal, 0), 1) {JOINS}
+        WHERE fvn.proteina_g IS NOT NULL AND fvn.carboidrato_total_g IS NOT NULL
+            AND fvn.lipidios_g IS NOT NULL AND fvn.energia_kcal > 0
+        ORDER BY f.code LIMIT 20"""),
+    ("5. calcium and iron", lambda engine: engine.rich_in_minerals(), f"""
+        SELECT f.name, f."group", fvn.calcio_mg, fvn.ferro_mg {JOINS}
+        WHERE fvn.calcio_mg > 100 AND fvn.ferro_mg > 1.8
+        ORDER BY (fvn.calcio_mg + fvn.ferro_mg * 50) DESC, f.code"""),
+    ("6. low sodium", lambda engine: engine.low_sodium(), f"""
+        SELECT f.name, f."group", fvn.sodio_mg {JOINS}
+        WHERE fvn.sodio_mg < 140 AND fvn.sodio_mg >= 0
+        ORDER BY fvn.sodio_mg ASC, f.code"""),
+    ("7. group comparison", lambda engine: engine.group_comparison('Frutas e derivados'), f"""
+        SELECT f.name, fvn.carboidrato_total_g, fvn.fibra_alimentar_g, fvn.vitamina_c_mg {JOINS}
+        WHERE f."group" = 'Frutas e derivados'
+            AND fvn.carboidrato_total_g IS NOT NULL AND fvn.fibra_alimentar_g IS NOT NULL
+        ORDER BY f.name COLLATE "C", f.code"""),
+    ("8. nutrient density", lambda engine: engine.nutrient_density(), f"""
+        SELECT f.name, f."group", fvn.energia_kcal, (
+            COALESCE(fvn.proteina_g, 0) + COALESCE(fvn.fibra_alimentar_g, 0) * 2
+            + COALESCE(fvn.vitamina_c_mg / 60, 0) + COALESCE(fvn.ferro_mg / 8, 0)
+            + COALESCE(fvn.calcio_mg / 800, 0) + COALESCE(fvn.vitamina_a_re_mcg / 800, 0)
+        ) / NULLIF(fvn.energia_kcal / 100, 0) AS score {JOINS}
+        WHERE fvn.energia_kcal > 0
+        ORDER BY score DESC, f.code LIMIT 20"""),
+]
+
+
+def same_value(a, b):
+    if isinstance(a, Decimal):
+        a = float(a)
+    if isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None:
+            return a is None and b is None
+        # ROUND on numerics and on floats may differ in the last digit
+        return abs(a - b) <= max(0.051, 1e-9 * abs(a))
+    return a == b
+
+
+def same_rows(expected, actual):
+    return len(expected) == len(actual) and all(
+        len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b)) for a, b in zip(expected, actual)
+    )
+
+
+def median_latency(function, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def run():
+    conn = postgresql_connection()
+    mismatches = 0
+    try:
+        reset_schema(conn)
+        batched(conn, TBCAProcessor(), synthetic_foods(TOTAL_FOODS))
+        started = time.perf_counter()
+        engine = load_queries(conn)
+        print(f"Engine built from the database in {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"({len(engine.table)} rows)")
+
+        cursor = conn.cursor()
+        for name, query, sql in QUERIES:
+            def run_sql():
+                cursor.execute(sql)
+                return cursor.fetchall()
+            sql_latency, expected = median_latency(run_sql)
+            engine_latency, actual = median_latency(lambda: query(engine))
+            status = "ok" if same_rows(expected, actual) else "MISMATCH"
+            mismatches += status != "ok"
+            print(f"{name:>24}: SQL {sql_latency * 1000:8.2f} ms  engine {engine_latency * 1000:7.3f} ms  "
+                  f"x{sql_latency / engine_latency:7.1f}  {len(actual):5d} rows  {status}")
+        cursor.close()
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+    return mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run() else 0)
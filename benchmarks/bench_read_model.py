@@ -0,0 +1,165 @@
+"""EXPLAIN-backed comparison of the example queries on the normalized tables and on the read model.
+
+Loads synthetic foods into a throwaway schema of the database configured
+by the DB_* environment variables and runs every example query three
+ways: joining foods, food_variations and food_variation_nutrients with
+only the indexes the old schema had, with the foreign key indexes of
+create_database.sql, and on the food_profiles materialized view. For each
+it reports the median latency and, from EXPLAIN (ANALYZE, BUFFERS), the
+plan's top node, the indexes used and the buffers touched. Then it times
+a concurrent and a plain refresh after 10% of the foods change.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_loader import BENCH_SCHEMA, batched, reset_schema, synthetic_foods
+from dbconnect import postgresql_connection
+from read_model import READ_MODEL, refresh_read_model
+from webscraping import TBCAProcessor
+
+TOTAL_FOODS = 5500
+REPEAT = 20
+
+JOINS = """FROM foods f
+    JOIN food_variations fv ON f.id = fv.food_id
+    JOIN food_variation_nutrients fvn ON fv.id = fvn.variation_id"""
+
+FOREIGN_KEY_INDEXES = [
+    "CREATE INDEX idx_food_variations_food_id ON food_variations (food_id)",
+    "CREATE UNIQUE INDEX idx_food_variation_nutrients_variation_id ON food_variation_nutrients (variation_id)",
+    "CREATE INDEX idx_food_nutrients_variation_id ON food_nutrients (variation_id)",
+]
+
+# example_queries.sql with ties broken by code; {source} is the FROM clause
+QUERIES = [
+    ("1. one food", """
+        SELECT f.code, f.name, f."group", fvn.proteina_g, fvn.energia_kcal {source}
+        WHERE f.code = 'BRC1234A' LIMIT 1"""),
+    ("2. top protein", """
+        SELECT f.name, f."group", fvn.proteina_g {source}
+        WHERE fvn.proteina_g IS NOT NULL
+        ORDER BY fvn.proteina_g DESC, f.code LIMIT 10"""),
+    ("3. vitamin C, low fat", """
+        SELECT f.name, f."group", fvn.vitamina_c_mg, fvn.lipidios_g {source}
+        WHERE fvn.vitamina_c_mg > 50 AND fvn.lipidios_g < 3
+        ORDER BY fvn.vitamina_c_mg DESC, f.code"""),
+    ("4. energy distribution", """
+        SELECT f.name, f."group", fvn.energia_kcal,
+            ROUND((fvn.proteina_g * 4 * 100) / NULLIF(fvn.energia_kcal, 0), 1) {source}
+        WHERE fvn.proteina_g IS NOT NULL AND fvn.carboidrato_total_g IS NOT NULL
+            AND fvn.lipidios_g IS NOT NULL AND fvn.energia_kcal > 0
+        ORDER BY f.code LIMIT 20"""),
+    ("5. calcium and iron", """
+        SELECT f.name, f."group", fvn.calcio_mg, fvn.ferro_mg {source}
+        WHERE fvn.calcio_mg > 100 AND fvn.ferro_mg > 1.8
+        ORDER BY (fvn.calcio_mg + fvn.ferro_mg * 50) DESC, f.code"""),
+    ("6. low sodium", """
+        SELECT f.name, f."group", fvn.sodio_mg {source}
+        WHERE fvn.sodio_mg < 140 AND fvn.sodio_mg >= 0
+        ORDER BY fvn.sodio_mg ASC, f.code"""),
+    ("7. group comparison", """
+        SELECT f.name, fvn.carboidrato_total_g, fvn.fibra_alimentar_g, fvn.vitamina_c_mg {source}
+        WHERE f."group" = 'Frutas e derivados'
+            AND fvn.carboidrato_total_g IS NOT NULL AND fvn.fibra_alimentar_g IS NOT NULL
+        ORDER BY f.name, f.code"""),
+    ("8. nutrient density", """
+        SELECT f.name, f."group", fvn.energia_kcal, (
+            COALESCE(fvn.proteina_g, 0) + COALESCE(fvn.fibra_alimentar_g, 0) * 2
+            + COALESCE(fvn.vitamina_c_mg / 60, 0) + COALESCE(fvn.ferro_mg / 8, 0)
+            + COALESCE(fvn.calcio_mg / 800, 0) + COALESCE(fvn.vitamina_a_re_mcg / 800, 0)
+        ) / NULLIF(fvn.energia_kcal / 100, 0) AS score {source}
+        WHERE fvn.energia_kcal > 0
+        ORDER BY score DESC, f.code LIMIT 20"""),
+]
+
+
+def normalized(query):
+    return query.format(source=JOINS)
+
+
+def read_model(query):
+    return query.replace("fvn.", "f.").format(source=f"FROM {READ_MODEL} f")
+
+
+def indexes_used(plan):
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        names |= indexes_used(child)
+    return names
+
+
+def explain(cursor, sql):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+    result = cursor.fetchone()[0][0]
+    plan = result['Plan']
+    buffers = plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+    return plan['Node Type'], sorted(indexes_used(plan)), buffers
+
+
+def median_latency(cursor, sql):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run():
+    processor = TBCAProcessor()
+    foods = synthetic_foods(TOTAL_FOODS)
+    conn = postgresql_connection()
+    try:
+        reset_schema(conn)
+        batched(conn, processor, foods)
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE")
+        conn.commit()
+
+        results = {}
+        for label, build in (("joins, old indexes", normalized), ("joins, FK indexes", normalized),
+                             ("read model", read_model)):
+            if label == "joins, FK indexes":
+                for statement in FOREIGN_KEY_INDEXES:
+                    cursor.execute(statement)
+                cursor.execute("ANALYZE")
+                conn.commit()
+            elif label == "read model":
+                elapsed = refresh_read_model(conn)
+                print(f"Read model created in {elapsed * 1000:.0f} ms")
+            print(f"\n{label}")
+            for name, query in QUERIES:
+                sql = build(query)
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+                latency = median_latency(cursor, sql)
+                node, indexes, buffers = explain(cursor, sql)
+                conn.commit()
+                same = results.setdefault(name, rows) == rows
+                print(f"{name:>24}: {latency * 1000:7.2f} ms  {buffers:5} buffers  {node:<14} "
+                      f"{', '.join(indexes) or 'no index':<60} same rows: {same}")
+
+        # Change 10% of the foods, then bring the view up to date both ways
+        changed = foods[::10]
+        for food_json in changed:
+            food_json['nutrients'][5]['Value per 100g'] = "99,9"
+        batched(conn, processor, changed)
+        elapsed = refresh_read_model(conn, concurrently=True)
+        print(f"\nConcurrent refresh after {len(changed)} changed foods: {elapsed * 1000:.0f} ms")
+        elapsed = refresh_read_model(conn, concurrently=False)
+        print(f"Plain refresh: {elapsed * 1000:.0f} ms")
+        cursor.close()
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,78 @@
+"""Measures recipe totals per second and checks them against a per-recipe Python loop.
+
+Recipes are random lists of 3-12 foods of a synthetic 5,500-food table,
+computed in batches with a cold and a warm food vector cache, and with a
+cache smaller than the set of foods in use.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_similar import synthetic_table
+from recipes import RecipeCalculator, sparse
+
+TOTAL_FOODS = 5500
+TOTAL_RECIPES = 10000
+
+
+def synthetic_recipes(codes, count, seed=3):
+    rng = np.random.default_rng(seed)
+    recipes = []
+    for _ in range(count):
+        foods = rng.choice(len(codes), rng.integers(3, 13), replace=False)
+        recipes.append([(codes[food], float(rng.integers(5, 400))) for food in foods])
+    return recipes
+
+
+def python_totals(table, recipes):
+    """The row-by-row scaling each app does today"""
+    results = []
+    for recipe in recipes:
+        totals = [0.0] * len(table.columns)
+        for code, grams in recipe:
+            for index, value in enumerate(table.row(code).tolist()):
+                if value == value:
+                    totals[index] += value * grams / 100
+        results.append(totals)
+    return np.array(results)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def run():
+    table = synthetic_table(TOTAL_FOODS)
+    recipes = synthetic_recipes(table.codes, TOTAL_RECIPES)
+    print(f"{TOTAL_RECIPES} recipes over {TOTAL_FOODS} foods, "
+          f"{'scipy.sparse' if sparse is not None else 'NumPy segmented sum'} product")
+
+    baseline_time, expected = timed(lambda: python_totals(table, recipes))
+    print(f"{'python loop':>22}: {TOTAL_RECIPES / baseline_time:10.0f} recipes/s")
+
+    calculator = RecipeCalculator.from_table(table)
+    for label in ("batched, cold cache", "batched, warm cache"):
+        elapsed, totals = timed(lambda: calculator.totals(recipes))
+        status = "ok" if np.allclose(totals, expected) else "MISMATCH"
+        print(f"{label:>22}: {TOTAL_RECIPES / elapsed:10.0f} recipes/s  {status}")
+
+    elapsed, _ = timed(lambda: [calculator.totals(recipes[start:start + 100])
+                                for start in range(0, TOTAL_RECIPES, 100)])
+    print(f"{'batches of 100':>22}: {TOTAL_RECIPES / elapsed:10.0f} recipes/s")
+
+    small = RecipeCalculator.from_table(table, cache_size=1000)
+    elapsed, totals = timed(lambda: np.vstack([small.totals(recipes[start:start + 50])
+                                               for start in range(0, TOTAL_RECIPES, 50)]))
+    status = "ok" if np.allclose(totals, expected) else "MISMATCH"
+    print(f"{'1000-food cache':>22}: {TOTAL_RECIPES / elapsed:10.0f} recipes/s  {status}  "
+          f"(hits {small.cache.hits}, misses {small.cache.misses})")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,79 @@
+"""Measures FoodSearch build time and lookup latency against a linear substring scan.
+
+Uses 5,500 synthetic foods with Portuguese names and TBCA-style
+descriptions, and queries that cover whole words, autocomplete prefixes,
+accents and typos.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import CLASSES, food_code
+from food_search import FoodSearch, fold
+from webscraping import TBCAProcessor
+
+TOTAL_FOODS = 5500
+REPEAT = 50
+
+BASES = ["Arroz", "Feijão", "Pão", "Maçã", "Banana", "Leite", "Queijo", "Frango", "Carne bovina", "Batata",
+         "Mandioca", "Açúcar", "Café", "Farinha de trigo", "Tomate", "Cenoura", "Peixe", "Ovo de galinha",
+         "Iogurte", "Biscoito", "Macarrão", "Milho", "Laranja", "Abóbora", "Chocolate"]
+VARIANTS = ["integral", "cozido", "cru", "frito", "assado", "grelhado", "refogado", "desidratado", "em conserva",
+            "light", "orgânico", "caseiro", "industrializado", "congelado", "tipo 1", "carioca", "preto"]
+EXTRAS = ["s/ sal", "c/ sal", "c/ casca", "s/ casca", "c/ óleo", "s/ óleo", "c/ açúcar", "s/ açúcar"]
+
+QUERIES = ["arroz", "feijao", "feijão carioca", "pao integral", "maca c/ casca", "leite sem acucar",
+           "fra", "frang", "frango gre", "a", "ab", "abo", "macarao", "chocolat", "fejao cozido", "xyz"]
+
+
+def synthetic_descriptions(count):
+    descriptions = []
+    for index in range(count):
+        base = BASES[index % len(BASES)]
+        variant = VARIANTS[(index // len(BASES)) % len(VARIANTS)]
+        extra = EXTRAS[(index // (len(BASES) * len(VARIANTS))) % len(EXTRAS)]
+        descriptions.append(f"{base}, {variant}, {extra}, {index}")
+    return descriptions
+
+
+def linear_scan(folded, query):
+    """What an unindexed ILIKE '%...%' does: a substring test of every row"""
+    words = fold(query).split()
+    return [index for index, text in enumerate(folded) if all(word in text for word in words)]
+
+
+def median_latency(function, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run():
+    processor = TBCAProcessor()
+    parts = [processor.process_description(description) for description in synthetic_descriptions(TOTAL_FOODS)]
+    codes = [food_code(index) for index in range(TOTAL_FOODS)]
+    groups = [CLASSES[index % len(CLASSES)] for index in range(TOTAL_FOODS)]
+
+    started = time.perf_counter()
+    index = FoodSearch(codes, [name for name, _ in parts], [description for _, description in parts], groups)
+    print(f"Index of {TOTAL_FOODS} foods built in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({len(index.vocabulary)} tokens, {len(index.prefixes)} prefixes)")
+
+    folded = [fold(f"{name} {description}") for name, description in parts]
+    for query in QUERIES:
+        indexed = median_latency(lambda: index.search(query, 10))
+        scanned = median_latency(lambda: linear_scan(folded, query), repeat=5)
+        results = index.search(query, 3)
+        top = ", ".join(f"{name} ({description})" for _, name, description, _ in results[:2])
+        print(f"{query!r:>20}: index {indexed * 1e6:7.1f} us  scan {scanned * 1e6:8.1f} us  "
+              f"{len(results)} results  {top[:70]}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,90 @@
+"""Measures "similar foods" query latency and the recall of the approximate search.
+
+Uses a synthetic table of foods whose nutrient profiles cluster by group,
+with about 10% missing values. The exact search is checked against a
+brute-force scan, and the index is saved and reloaded.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import CLASSES, food_code
+from columnar_export import NutrientTable
+from nutrients import COLUMNS
+from similar_foods import SimilarFoods, load_similar_foods
+
+TOTAL_FOODS = 5500
+QUERIES = 500
+K = 10
+
+
+def synthetic_table(count, seed=1):
+    rng = np.random.default_rng(seed)
+    group_profiles = rng.normal(0, 1, (len(CLASSES), len(COLUMNS)))
+    groups = rng.integers(0, len(CLASSES), count)
+    values = np.exp(group_profiles[groups] + rng.normal(0, 0.7, (count, len(COLUMNS))))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    return NutrientTable([food_code(i) for i in range(count)], [f"Alimento {i}" for i in range(count)],
+                         [CLASSES[group] for group in groups], [""] * count, values)
+
+
+def brute_force(index, rows, k):
+    results = []
+    for row in rows:
+        distances = np.linalg.norm(index.vectors.astype(np.float64) - index.vectors[row], axis=1)
+        distances[row] = np.inf
+        results.append(np.argsort(distances, kind='stable')[:k])
+    return np.array(results)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def run():
+    table = synthetic_table(TOTAL_FOODS)
+    elapsed, index = timed(lambda: SimilarFoods(table))
+    print(f"Index of {len(table)} foods x {len(COLUMNS)} nutrients built in {elapsed * 1000:.1f} ms")
+
+    rows = np.random.default_rng(2).choice(len(table), QUERIES, replace=False)
+    codes = [table.codes[row] for row in rows]
+    queries = index.vectors[rows]
+
+    brute_time, expected = timed(lambda: brute_force(index, rows, K))
+    single_time, _ = timed(lambda: [index.similar(code, K) for code in codes])
+    batch_time, (_, exact) = timed(lambda: index.search(queries, K, exclude_rows=rows))
+    approximate_single, _ = timed(lambda: [index.similar(code, K, approximate=True) for code in codes])
+    approximate_time, (_, approximate) = timed(lambda: index.search(queries, K, approximate=True, exclude_rows=rows))
+
+    def recall(found):
+        return np.mean([len(set(a) & set(b)) / K for a, b in zip(found.tolist(), expected.tolist())])
+
+    for name, elapsed, found in (("brute force", brute_time, expected), ("exact", single_time, exact),
+                                 ("exact, batched", batch_time, exact),
+                                 ("approximate", approximate_single, approximate),
+                                 ("approximate, batched", approximate_time, approximate)):
+        print(f"{name:>22}: {elapsed / QUERIES * 1e6:9.1f} us/query  recall@{K} {recall(found):.3f}")
+
+    group = CLASSES[0]
+    _, grouped = timed(lambda: index.similar(codes[0], K, group=group))
+    print(f"{'group filter':>22}: {len(grouped)} results, all in {group!r}: "
+          f"{all(result[2] == group for result in grouped)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "similar_foods.npz")
+        index.save(path)
+        elapsed, reloaded = timed(lambda: load_similar_foods(path))
+        same = reloaded.similar_many(codes[:50], K) == index.similar_many(codes[:50], K)
+        print(f"{'reload':>22}: {elapsed * 1000:9.1f} ms, {os.path.getsize(path) / 1024:.0f} KiB, "
+              f"same results: {same}")
+
+
+if __name__ == "__main__":
+    run()
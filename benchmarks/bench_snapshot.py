@@ -0,0 +1,79 @@
+"""Compares the compressed snapshot with the old append-only foods.txt.
+
+Writes 5,500 synthetic foods both ways and reports write time, size on
+disk, a full streaming read and single-food lookups. The old format
+needs a scan of the file to find one food.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_loader import synthetic_foods
+from snapshot import Snapshot, SnapshotWriter, iter_lines, zstandard
+
+TOTAL_FOODS = 5500
+LOOKUPS = 200
+
+
+def append_lines(path, foods):
+    """What TBCAProcessor.save_to_file used to do: reopen the file in append mode for every food"""
+    for food_json in foods:
+        with open(path, "a", encoding='utf-8') as file:
+            file.write(json.dumps(food_json, ensure_ascii=False) + "\n")
+
+
+def scan_for(path, code):
+    for line in iter_lines(path):
+        food_json = json.loads(line)
+        if food_json['code'] == code:
+            return food_json
+
+
+def write_snapshot(path, foods):
+    writer = SnapshotWriter(path).open()
+    for food_json in foods:
+        writer.write(food_json)
+    writer.close()
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def run():
+    foods = synthetic_foods(TOTAL_FOODS)
+    codes = random.Random(0).sample([food_json['code'] for food_json in foods], LOOKUPS)
+    with tempfile.TemporaryDirectory() as directory:
+        targets = [("foods.txt", append_lines), ("foods.jsonl.gz", write_snapshot)]
+        if zstandard is not None:
+            targets.append(("foods.jsonl.zst", write_snapshot))
+        else:
+            print("zstandard is not installed, skipping .zst")
+
+        for name, write in targets:
+            path = os.path.join(directory, name)
+            write_time, _ = timed(lambda: write(path, foods))
+            size = os.path.getsize(path)
+            read_time, count = timed(lambda: sum(1 for _ in map(json.loads, iter_lines(path))))
+            if name.endswith(".txt"):
+                lookup_time, found = timed(lambda: [scan_for(path, code) for code in codes[:10]])
+                lookups = 10
+            else:
+                with Snapshot(path) as snapshot:
+                    lookup_time, found = timed(lambda: [snapshot.get(code) for code in codes])
+                lookups = LOOKUPS
+            same = all(food_json is not None and food_json['code'] == code for food_json, code in zip(found, codes))
+            print(f"{name:>16}: write {write_time * 1000:7.1f} ms  {size / 1024:7.0f} KiB  "
+                  f"read all {read_time * 1000:6.1f} ms ({count} foods)  "
+                  f"lookup {lookup_time / lookups * 1e6:9.1f} us  found: {same}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,248 @@
+"""Local stand-in for tbca.net.br serving canned listing and detail pages"""
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+NUTRIENTS = [
+    ("Energia", "kJ", "{kj}"),
+    ("Energia", "kcal", "{kcal}"),
+    ("Umidade", "g", "{moisture}"),
+    ("Carboidrato total", "g", "{carbs}"),
+    ("Proteína", "g", "{protein}"),
+    ("Lipídios", "g", "{fat}"),
+    ("Fibra alimentar", "g", "NA"),
+    ("Cálcio", "mg", "{calcium}"),
+    ("Ferro", "mg", "{iron}"),
+    ("Sódio", "mg", "{sodium}"),
+    ("Vitamina C", "mg", "{vitamin_c}"),
+]
+
+CLASSES = ["Cereais e derivados", "Frutas e derivados", "Carnes e derivados", "Leite e derivados"]
+
+
+def food_code(index):
+    return f"BRC{index:04d}A"
+
+
+def render_listing_page(page, page_size, total_foods, page_window=None):
+    """Listing page linking the last page, or only the next page_window pages when set"""
+    first = (page - 1) * page_size
+    last = min(first + page_size, total_foods)
+    rows = []
+    for index in range(first, last):
+        code = food_code(index)
+        rows.append(
+            f"<tr><td><a href=\"int_composicao_alimentos.php?cod_produto={code}\">{code}</a></td>"
+            f"<td>Alimento {index}</td><td>-</td><td>{CLASSES[index % len(CLASSES)]}</td></tr>"
+        )
+    page_count = max(1, -(-total_foods // page_size))
+    next_link = '<a href="?page={0}">próxima »</a>'.format(page + 1) if last < total_foods else ""
+    if page_window:
+        last_link = "".join('<a href="?page={0}">{0}</a>'.format(number)
+                            for number in range(page + 1, min(page + page_window, page_count) + 1))
+    else:
+        last_link = '<a href="?page={0}">última</a>'.format(page_count)
+    return (
+        "<html><head><title>TBCA</title></head><body>"
+        "<table><tr><th>Código</th><th>Nome</th><th>Nome científico</th><th>Grupo</th></tr>"
+        + "".join(rows) + "</table>" + next_link + last_link + "</body></html>"
+    )
+
+
+def render_detail_page(code):
+    index = int(code[3:7]) if code[3:7].isdigit() else 0
+    values = {
+        "kj": f"{100 + index % 900},00",
+        "kcal": f"{24 + index % 215},00",
+        "moisture": f"{index % 90},5",
+        "carbs": f"{index % 70},12",
+        "protein": f"{index % 35},40",
+        "fat": f"{index % 25},03",
+        "calcium": f"{index % 300},0",
+        "iron": f"{index % 9},71",
+        "sodium": f"{index % 600},0",
+        "vitamin_c": f"{index % 120},9",
+    }
+    rows = "".join(
+        f"<tr><td>{component}</td><td>{unit}</td><td>{value.format(**values)}</td></tr>"
+        for component, unit, value in NUTRIENTS
+    )
+    return (
+        f"<html><head><title>TBCA</title></head><body><h2>Alimento {index}, cozido, s/ sal</h2>"
+        "<table><tr><th>Componente</th><th>Unidades</th><th>Valor por 100 g</th></tr>"
+        + rows + "</table></body></html>"
+    )
+
+
+def page_name(query):
+    """File name of a page in a replay directory: listing-<page>.html or <code>.html"""
+    if "codigo_alimento" in query:
+        return f"{query['codigo_alimento'][0]}.html"
+    return f"listing-{int(query.get('page', ['1'])[0])}.html"
+
+
+def save_pages(directory, total_foods=500, page_size=50, page_window=None):
+    """Writes the generated pages to a directory, to edit or replace with captured ones and replay"""
+    os.makedirs(directory, exist_ok=True)
+    page_count = max(1, -(-total_foods // page_size))
+    pages = [(f"listing-{page}.html", render_listing_page(page, page_size, total_foods, page_window))
+             for page in range(1, page_count + 1)]
+    pages += [(f"{food_code(index)}.html", render_detail_page(food_code(index))) for index in range(total_foods)]
+    for name, body in pages:
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+            file.write(body)
+
+
+class ServerState:
+    """Settings and request counters shared by the handler threads"""
+
+    def __init__(self, total_foods, page_size, latency, failure_rate, drop_rate, failure_status,
+                 replay_dir, seed, page_window=None, truncate_rate=0.0, failing_codes=()):
+        self.total_foods = total_foods
+        self.page_size = page_size
+        self.page_window = page_window
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.truncate_rate = truncate_rate
+        self.failing_codes = set(failing_codes)
+        self.failure_status = failure_status
+        self.replay_dir = replay_dir
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "failures_injected": 0, "drops_injected": 0, "truncations_injected": 0,
+                         "replayed": 0}
+
+    def roll(self):
+        with self.lock:
+            self.counters["requests"] += 1
+            return self.random.random()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def body(self, query):
+        if self.replay_dir:
+            path = os.path.join(self.replay_dir, page_name(query))
+            if os.path.exists(path):
+                self.count("replayed")
+                with open(path, encoding="utf-8") as file:
+                    return file.read()
+        if "codigo_alimento" in query:
+            return render_detail_page(query["codigo_alimento"][0])
+        return render_listing_page(int(query.get("page", ["1"])[0]), self.page_size, self.total_foods,
+                                   self.page_window)
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if state.latency:
+                time.sleep(state.latency)
+            roll = state.roll()
+            query = parse_qs(urlparse(self.path).query)
+            if roll < state.failure_rate or query.get("codigo_alimento", [None])[0] in state.failing_codes:
+                state.count("failures_injected")
+                self.send_response(state.failure_status)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if roll < state.failure_rate + state.drop_rate:
+                # Hang up without answering, like a reset connection
+                state.count("drops_injected")
+                self.close_connection = True
+                return
+            payload = state.body(query).encode("utf-8")
+            etag = '"%s"' % hashlib.md5(payload).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if roll < state.failure_rate + state.drop_rate + state.truncate_rate:
+                # Reset the connection halfway through the body
+                state.count("truncations_injected")
+                self.wfile.write(payload[:len(payload) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-request (e.g. a killed scraper) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockTBCAServer:
+    """Runs the stand-in server on a background thread; use as a context manager.
+
+    Every request waits `latency` seconds. A `failure_rate` fraction of the
+    requests is answered with `failure_status` (and Retry-After: 0) and a
+    `drop_rate` fraction is dropped without a response. For a
+    `truncate_rate` fraction, the connection is closed halfway through the
+    body. All of them are drawn from a random generator seeded with `seed`,
+    so runs are repeatable. Pages found
+    in `replay_dir` (see save_pages) are served instead of the generated
+    ones. With `page_window`, listing pages only link the next
+    `page_window` pages instead of the last one, like windowed
+    paginators. The detail pages of `failing_codes` always fail with
+    `failure_status`. `counters` holds the requests and injected failures.
+    """
+
+    def __init__(self, total_foods=500, page_size=50, latency=0.02, port=0, failure_rate=0.0, drop_rate=0.0,
+                 failure_status=503, replay_dir=None, seed=0, page_window=None, truncate_rate=0.0,
+                 failing_codes=()):
+        self.state = ServerState(total_foods, page_size, latency, failure_rate, drop_rate, failure_status,
+                                 replay_dir, seed, page_window, truncate_rate, failing_codes)
+        self.httpd = MockHTTPServer(("127.0.0.1", port), make_handler(self.state))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/base-dados/composicao_alimentos.php"
+
+    @property
+    def counters(self):
+        with self.state.lock:
+            return dict(self.state.counters)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    with MockTBCAServer(port=8000) as server:
+        print(f"Serving mock TBCA at {server.base_url}")
+        server.thread.join()
@@ -0,0 +1,406 @@
+"""Offline benchmark and regression suite for the scraping and loading pipeline.
+
+Every scenario runs against the local mock TBCA server and a throwaway
+PostgreSQL schema (regression_suite), so nothing touches tbca.net.br or
+the tables of the configured database:
+
+    scrape              run_webscraping to the snapshot and the database, with injected failures,
+                        dropped connections and bodies cut off halfway
+    load_file           process_existing_file of the scraped snapshot
+    load_file_parallel  the same with parser processes and writer connections
+    migrate             populate_nutrients_table + migrate_data from the legacy food_nutrients rows
+    persistent_failure  three runs while one food always fails and the listing grows, then
+                        recovers: finished runs must not be resumed
+    kill_resume         run_webscraping killed in the middle of a batch and resumed: every food
+                        ends up exactly once in the snapshot and the database
+
+Each scenario also checks its output: every food is stored and the
+nutrient values are identical whichever path wrote them. Results are
+appended to benchmarks/results/history.jsonl (not versioned) and compared
+with the reference run in benchmarks/baseline.json, which is committed
+together with notes on the machine that produced it. A scenario whose
+throughput drops more than --tolerance below the baseline counts as a
+regression, and the suite exits with status 1 on regressions or failed
+checks. --save-baseline stores the current run as the new baseline,
+with --notes describing the machine. Without a
+database (DB_* variables unset or unreachable) only the scrape scenario
+runs, writing the snapshot.
+
+    python benchmarks/regression_suite.py [--foods 1000] [--failure-rate 0.02] [--save-baseline --notes "..."]
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mock_tbca_server import MockTBCAServer, food_code
+from bench_loader import count_rows, reset_schema
+from dbconnect import postgresql_connection
+from migrate_data import migrate_data, populate_nutrients_table
+from nutrients import COLUMNS, NUTRIENTS
+from snapshot import FRAME_SIZE, SNAPSHOT_PATH, Snapshot
+from webscraping import process_existing_file, run_webscraping
+
+SCHEMA = "regression_suite"
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Settings that must match the baseline for timings to be comparable
+SETTINGS = ("foods", "latency", "failure_rate", "drop_rate", "truncate_rate", "workers", "batch_size")
+
+NUTRIENTS_SQL = """
+CREATE TABLE nutrients (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    unit_of_measurement VARCHAR(50) NOT NULL,
+    category VARCHAR(100) NOT NULL
+)
+"""
+
+
+def measure(function, *args, **kwargs):
+    """Runs a function with its output captured; returns (seconds, output)"""
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        function(*args, **kwargs)
+    return time.perf_counter() - started, output.getvalue()
+
+
+def nutrient_snapshot(conn):
+    """Returns (code, nutrient values...) of every stored food, ordered by code"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT f.code, {', '.join(f'fvn.{column}' for column in COLUMNS)}
+            FROM foods f
+            JOIN food_variations fv ON fv.food_id = f.id
+            JOIN food_variation_nutrients fvn ON fvn.variation_id = fv.id
+            ORDER BY f.code
+        """)
+        rows = cursor.fetchall()
+    conn.commit()
+    return rows
+
+
+def stage_totals(report_path):
+    with open(report_path, encoding="utf-8") as file:
+        report = json.load(file)
+    return {stage: summary["total_seconds"] for stage, summary in report["stages"].items()}, report["counters"]
+
+
+def result(foods, seconds, checks, output, **extra):
+    return dict({"foods": foods, "seconds": round(seconds, 3),
+                 "foods_per_second": round(foods / seconds, 1) if seconds else None,
+                 "checks": checks, "output": output}, **extra)
+
+
+def scrape(args, state):
+    with MockTBCAServer(total_foods=args.foods, latency=args.latency, failure_rate=args.failure_rate,
+                        drop_rate=args.drop_rate, truncate_rate=args.truncate_rate, seed=args.seed) as server:
+        seconds, output = measure(run_webscraping, save_to_file=True, save_to_db=state["conn"] is not None,
+                                  workers=args.workers, base_url=server.base_url, max_retries=8,
+                                  batch_size=args.batch_size, report_path="data/scrape_report.json")
+        served = server.counters
+    stages, counters = stage_totals("data/scrape_report.json")
+    with Snapshot(SNAPSHOT_PATH) as snapshot:
+        stored = len(snapshot)
+    checks = {
+        "every food in the snapshot": stored == args.foods,
+        "every failure retried": counters["failures"] == 0 and counters.get("foods_failed", 0) == 0,
+    }
+    if state["conn"] is not None:
+        state["snapshot"] = nutrient_snapshot(state["conn"])
+        checks["every food in the database"] = len(state["snapshot"]) == args.foods
+    return result(args.foods, seconds, checks, output, stages=stages,
+                  counters={name: counters[name] for name in ("requests", "retries", "bytes_received")},
+                  injected=served["failures_injected"] + served["drops_injected"] + served["truncations_injected"])
+
+
+def load_file(args, state, workers=1, writers=1):
+    reset_schema(state["conn"], SCHEMA)
+    seconds, output = measure(process_existing_file, batch_size=args.batch_size, workers=workers,
+                              writers=writers, report_path="data/load_report.json")
+    stages, _ = stage_totals("data/load_report.json")
+    snapshot = nutrient_snapshot(state["conn"])
+    checks = {"same nutrients as the scrape": snapshot == state["snapshot"]}
+    return result(args.foods, seconds, checks, output, stages=stages)
+
+
+def load_file_parallel(args, state):
+    return load_file(args, state, workers=2, writers=2)
+
+
+def migrate(args, state):
+    conn = state["conn"]
+    with conn.cursor() as cursor:
+        cursor.execute(NUTRIENTS_SQL)
+        cursor.execute("DELETE FROM food_variation_nutrients")
+    conn.commit()
+
+    def run():
+        populate_nutrients_table()
+        migrate_data()
+
+    seconds, output = measure(run)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM nutrients")
+        nutrient_count = cursor.fetchone()[0]
+    conn.commit()
+    checks = {"nutrients table populated": nutrient_count == len(NUTRIENTS),
+              "same nutrients as the scrape": nutrient_snapshot(conn) == state["snapshot"]}
+    return result(args.foods, seconds, checks, output, rows=count_rows(conn))
+
+
+def stored_foods(state):
+    """Returns the number of foods in the snapshot and in the database (None without one)"""
+    with Snapshot(SNAPSHOT_PATH) as snapshot:
+        in_snapshot = len(snapshot)
+    if state["conn"] is None:
+        return in_snapshot, None
+    with state["conn"].cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM foods")
+        in_database = cursor.fetchone()[0]
+    state["conn"].commit()
+    return in_snapshot, in_database
+
+
+def persistent_failure(args, state):
+    # Starts from an empty snapshot, database and checkpoint
+    shutil.rmtree("data", ignore_errors=True)
+    if state["conn"] is not None:
+        reset_schema(state["conn"], SCHEMA)
+    failing = food_code(7)
+    first_foods = max(args.foods // 2, 10)
+    counts = []
+
+    def scrape_run(total_foods, failing_codes):
+        with MockTBCAServer(total_foods=total_foods, latency=args.latency, failing_codes=failing_codes) as server:
+            run_webscraping(save_to_file=True, save_to_db=state["conn"] is not None, workers=args.workers,
+                            base_url=server.base_url, max_retries=1, batch_size=args.batch_size,
+                            report_path=None)
+        counts.append(stored_foods(state))
+
+    def run():
+        scrape_run(first_foods, {failing})
+        # The listing grows while the food still fails: the next run must crawl it again
+        scrape_run(args.foods, {failing})
+        scrape_run(args.foods, ())
+
+    seconds, output = measure(run)
+    expected = [first_foods - 1, args.foods - 1, args.foods]
+    checks = {
+        "failed food left out": counts[0][0] == expected[0],
+        "foods added after a run with errors": counts[1][0] == expected[1],
+        "failed food stored once it recovers": counts[2][0] == expected[2],
+        "finished runs not resumed": "Resuming interrupted run" not in output,
+        "checkpoint cleared": not os.path.exists("data/scrape_checkpoint.json"),
+    }
+    if state["conn"] is not None:
+        checks["same foods in the database"] = [count[1] for count in counts] == expected
+    # Its time is mostly the backoff of the failing food, so it is a check and not a benchmark
+    return result(first_foods + 2 * args.foods, seconds, checks, output, timed=False)
+
+
+# run_webscraping in a child process, so it can be killed like a crashed run
+KILLED_RUN = """
+import sys
+sys.path.insert(0, {src_dir!r})
+from webscraping import run_webscraping
+run_webscraping(save_to_file=True, save_to_db={save_to_db}, workers={workers}, base_url={base_url!r},
+                batch_size={batch_size}, report_path=None)
+"""
+
+
+def committed_foods(state):
+    """Number of foods in the checkpoint of the running scrape, 0 before its first commit"""
+    if state["conn"] is None:
+        try:
+            with open("data/scrape_checkpoint.json", encoding="utf-8") as file:
+                return len(json.load(file)["completed"])
+        except (OSError, ValueError):
+            return 0
+    try:
+        with state["conn"].cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM scrape_checkpoint WHERE kind = 'done'")
+            count = cursor.fetchone()[0]
+        state["conn"].commit()
+        return count
+    except Exception:
+        state["conn"].rollback()
+        return 0
+
+
+def kill_resume(args, state):
+    shutil.rmtree("data", ignore_errors=True)
+    if state["conn"] is not None:
+        reset_schema(state["conn"], SCHEMA)
+    # Batches span several snapshot frames, so frames written after a commit reach the disk
+    batch_size = 2 * FRAME_SIZE
+    with MockTBCAServer(total_foods=args.foods, latency=args.latency) as server:
+        process = subprocess.Popen(
+            [sys.executable, "-c", KILLED_RUN.format(src_dir=SRC_DIR, save_to_db=state["conn"] is not None,
+                                                      workers=args.workers, base_url=server.base_url,
+                                                      batch_size=batch_size)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while process.poll() is None and committed_foods(state) < batch_size:
+            time.sleep(0.01)
+        # Kill it once output past the commit is on disk, which the resumed run must truncate
+        committed_size = os.path.getsize(SNAPSHOT_PATH + ".tmp") if process.poll() is None else 0
+        while process.poll() is None and os.path.getsize(SNAPSHOT_PATH + ".tmp") <= committed_size:
+            time.sleep(0.01)
+        interrupted = process.poll() is None
+        process.kill()
+        process.wait()
+        committed = committed_foods(state)
+        seconds, output = measure(run_webscraping, save_to_file=True, save_to_db=state["conn"] is not None,
+                                  workers=args.workers, base_url=server.base_url, batch_size=batch_size,
+                                  report_path=None)
+
+    expected = {food_code(index) for index in range(args.foods)}
+    # Every line of the published file, not only the index entries
+    with gzip.open(SNAPSHOT_PATH, "rt", encoding="utf-8") as file:
+        lines = Counter(json.loads(line)["code"] for line in file)
+    checks = {
+        "killed in the middle of the run": interrupted and 0 < committed < args.foods,
+        "interrupted run resumed": "Resuming interrupted run" in output,
+        "every food once in the snapshot": set(lines) == expected and max(lines.values()) == 1,
+        "checkpoint cleared": not os.path.exists("data/scrape_checkpoint.json"),
+    }
+    if state["conn"] is not None:
+        rows = Counter(row[0] for row in nutrient_snapshot(state["conn"]))
+        checks["every food once in the database"] = set(rows) == expected and max(rows.values()) == 1
+    return result(args.foods - committed, seconds, checks, output, committed_before_kill=committed)
+
+
+SCENARIOS = {"scrape": scrape, "load_file": load_file, "load_file_parallel": load_file_parallel,
+             "migrate": migrate, "persistent_failure": persistent_failure, "kill_resume": kill_resume}
+DATABASE_SCENARIOS = {"load_file", "load_file_parallel", "migrate"}
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(run, baseline, tolerance):
+    """Prints the change in throughput of every scenario; returns the names of the regressions"""
+    if baseline["settings"] != run["settings"]:
+        print(f"Baseline ({baseline['version']}) used different settings {baseline['settings']}, not comparing.")
+        return []
+    if (baseline.get("machine"), baseline.get("cpus")) != (run["machine"], run["cpus"]):
+        print(f"Baseline was measured on another machine ({baseline.get('cpus')} CPUs, {baseline.get('notes')}); "
+              f"expect differences beyond the code.")
+    regressions = []
+    for name, scenario in run["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not scenario.get("timed", True) or not previous or not previous["foods_per_second"] \
+                or not scenario["foods_per_second"]:
+            continue
+        change = scenario["foods_per_second"] / previous["foods_per_second"] - 1
+        regressed = change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>20}: {change:+7.1%} vs {baseline['version']} "
+              f"({previous['foods_per_second']} foods/s){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=1000, help="foods served by the mock server")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every request")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="fraction of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.01, help="fraction of connections dropped")
+    parser.add_argument("--truncate-rate", type=float, default=0.01,
+                        help="fraction of responses cut off halfway through the body")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="throughput drop against the baseline that counts as a regression")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="where history.jsonl is appended")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="reference run to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--notes", default="", help="machine notes stored with the run, e.g. CPU and disk")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    # Every connection opened by the code under test works inside the throwaway schema
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    state = {"conn": None, "snapshot": None}
+    try:
+        state["conn"] = postgresql_connection()
+        reset_schema(state["conn"], SCHEMA)
+    except Exception as e:
+        print(f"No database available ({str(e).strip().splitlines()[0]}); running the scrape scenario against the file only.")
+
+    run_results = {"version": git_version(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "python": platform.python_version(), "machine": platform.machine(),
+                   "platform": platform.platform(), "cpus": os.cpu_count(), "notes": args.notes,
+                   "postgresql": state["conn"].server_version if state["conn"] is not None else None,
+                   "settings": {name: getattr(args, name) for name in SETTINGS},
+                   "scenarios": {}}
+    failed_checks = []
+    original_directory = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            # The scraper writes its snapshot, checkpoint and reports relative to the working directory
+            os.chdir(directory)
+            for name in args.scenarios:
+                if name in DATABASE_SCENARIOS and (state["conn"] is None or state["snapshot"] is None):
+                    print(f"{name:>20}: skipped (needs the database and the scrape scenario)")
+                    continue
+                scenario = SCENARIOS[name](args, state)
+                output = scenario.pop("output")
+                run_results["scenarios"][name] = scenario
+                failed = [check for check, passed in scenario["checks"].items() if not passed]
+                print(f"{name:>20}: {scenario['seconds']:8.2f}s  {scenario['foods_per_second']:>8} foods/s  "
+                      f"{'FAILED: ' + ', '.join(failed) if failed else 'checks passed'}")
+                if failed:
+                    failed_checks.append(name)
+                    print("\n".join(output.splitlines()[-20:]))
+    finally:
+        os.chdir(original_directory)
+        if state["conn"] is not None:
+            with state["conn"].cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            state["conn"].commit()
+            state["conn"].close()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    with open(os.path.join(args.results_dir, "history.jsonl"), "a", encoding="utf-8") as file:
+        file.write(json.dumps(run_results) + "\n")
+    baseline_path = args.baseline
+    regressions = []
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as file:
+            regressions = compare(run_results, json.load(file), args.tolerance)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(run_results, file, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+
+    if failed_checks or regressions:
+        print(f"Failed checks: {failed_checks}, regressions: {regressions}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
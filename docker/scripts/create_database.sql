@@ -1,30 +1,36 @@
+-- Tables written by webscraping.py, bulk_loader.py and migrate_data.py
 CREATE TABLE IF NOT EXISTS foods (
     id SERIAL PRIMARY KEY,
     code VARCHAR(15) UNIQUE NOT NULL,
     name VARCHAR(255) NOT NULL,
-    group VARCHAR(255) NOT NULL,
+    "group" VARCHAR(255) NOT NULL,
+    content_hash VARCHAR(64),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE TABLE IF NOT EXISTS nutrient (
+-- Content hash of the scraped page, used by the delta scrape mode
+ALTER TABLE foods ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+CREATE TABLE IF NOT EXISTS food_variations (
     id SERIAL PRIMARY KEY,
-    category_id INTEGER REFERENCES nutrient_category(id),
-    name VARCHAR(500) NOT NULL UNIQUE,
-    unit VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    food_id INTEGER NOT NULL REFERENCES foods(id),
+    description TEXT
 );
 
-CREATE TABLE IF NOT EXISTS nutrient_category (
+-- Nutrients as scraped: one (component, unit, value) row per nutrient
+CREATE TABLE IF NOT EXISTS food_nutrients (
     id SERIAL PRIMARY KEY,
-    name VARCHAR(100) NOT NULL UNIQUE,
-    description TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    variation_id INTEGER REFERENCES food_variations(id),
+    component VARCHAR(500),
+    unit_of_measurement VARCHAR(100),
+    value_per_100g VARCHAR(100)
 );
 
-CREATE TABLE IF NOT EXISTS food_nutrients (
+-- Nutrients as numbers: one row per variation, one column per nutrient (see nutrients.py)
+CREATE TABLE IF NOT EXISTS food_variation_nutrients (
     id SERIAL PRIMARY KEY,
-    food_id INTEGER REFERENCES food(id),
-    
+    variation_id INTEGER NOT NULL REFERENCES food_variations(id),
+
     -- Energy and macronutrients
     energia_kj DECIMAL(10,2),
     energia_kcal DECIMAL(10,2),
@@ -71,11 +77,33 @@ CREATE TABLE IF NOT EXISTS food_nutrients (
     
     -- Additional nutrients
     sal_de_adicao_g DECIMAL(10,2),
-    acucar_de_adicao_g DECIMAL(10,2),
-    
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    acucar_de_adicao_g DECIMAL(10,2)
+);
+
+-- Reference list of the nutrients, filled by migrate_data.populate_nutrients_table
+CREATE TABLE IF NOT EXISTS nutrients (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    unit_of_measurement VARCHAR(50) NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    UNIQUE (name, unit_of_measurement)
+);
+
+-- Progress of the current scrape run, used to resume interrupted runs
+CREATE TABLE IF NOT EXISTS scrape_checkpoint (
+    kind VARCHAR(10) NOT NULL,
+    key VARCHAR(50) NOT NULL,
+    value TEXT,
+    PRIMARY KEY (kind, key)
 );
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_foods_code ON foods(code);
-CREATE INDEX IF NOT EXISTS idx_food_nutrients_food_id ON food_nutrients(food_id);
\ No newline at end of file
+-- Join paths of the loader and the queries (foods.code is indexed by its UNIQUE constraint)
+CREATE INDEX IF NOT EXISTS idx_food_variations_food_id ON food_variations (food_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_food_variation_nutrients_variation_id
+    ON food_variation_nutrients (variation_id);
+-- Serves the deletes of re-saved foods and the variation ranges of migrate_data
+CREATE INDEX IF NOT EXISTS idx_food_nutrients_variation_id ON food_nutrients (variation_id);
+
+-- The food_profiles read model is defined in src/read_model.py and created by
+-- refresh_read_model at the end of the first scrape, load or migration
+-- (or by hand with python src/read_model.py).
@@ -0,0 +1,15 @@
+-- Optional indexes for accent-insensitive name search (ILIKE, similarity and full text),
+-- run after create_database.sql. They need the pg_trgm and unaccent extensions, which
+-- ship with the official PostgreSQL images; skip this script where they are not available.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() is only STABLE, so it is wrapped to be usable in index expressions
+CREATE OR REPLACE FUNCTION search_fold(text) RETURNS text AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+CREATE INDEX IF NOT EXISTS idx_foods_name_trgm ON foods USING gin (search_fold(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_food_variations_description_trgm
+    ON food_variations USING gin (search_fold(description) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_foods_name_fts ON foods USING gin (to_tsvector('portuguese', search_fold(name)));
@@ -0,0 +1,169 @@
+import io
+
+from psycopg2.extras import execute_values
+
+from metrics import timed
+from nutrients import COLUMNS
+
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_text(value):
+    """Formats a value for PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Streams rows into a table with COPY FROM STDIN"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_text(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def prepare_food(processor, food_json):
+    """Normalizes a food into the record BulkLoader writes.
+
+    Returns (code, name, group, content_hash, variation description,
+    legacy nutrient rows, numeric values in COLUMNS order). This is the CPU-bound
+    part of loading, so it can run in worker processes.
+    """
+    main_part, observations_line = processor.process_description(food_json['description'])
+    legacy_rows, nutrient_values = processor.extract_nutrients(food_json)
+    return (food_json['code'], main_part, food_json['class'], processor.content_hash(food_json),
+            observations_line, legacy_rows, nutrient_values)
+
+
+class BulkLoader:
+    """Buffers foods and writes them to the database in batches.
+
+    Each batch is one transaction: foods are upserted with a single
+    multi-row INSERT, variation ids are resolved in bulk and the nutrient
+    tables are filled with COPY. The result in the database is the same as
+    calling TBCAProcessor.save_to_db for every food. If a batch fails it
+    is rolled back and retried food by food, so one bad record only loses
+    itself. Foods can be queued as JSON (add) or as records already built
+    by prepare_food (add_prepared).
+
+    on_commit(cursor, failed_codes) is called inside every batch
+    transaction right before it commits, so other state (e.g. a
+    checkpoint) commits atomically with the foods. failed_codes lists the
+    foods of the batch that could not be written. With a metrics.Metrics
+    the normalize, db_write and commit stages are timed into it.
+    """
+
+    def __init__(self, conn, processor, batch_size=500, on_commit=None, metrics=None):
+        self.conn = conn
+        self.processor = processor
+        self.batch_size = batch_size
+        self.on_commit = on_commit
+        self.metrics = metrics
+        self.pending = {}
+        self.saved_count = 0
+        self.failed_count = 0
+
+    def add(self, food_json):
+        """Queues a food, flushing the batch when it is full"""
+        with timed(self.metrics, 'normalize'):
+            record = prepare_food(self.processor, food_json)
+        self.add_prepared(record)
+
+    def add_prepared(self, record):
+        """Queues a record built by prepare_food"""
+        code = record[0]
+        # A later copy of the same code replaces the earlier one, like successive upserts would
+        self.pending.pop(code, None)
+        self.pending[code] = record
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes and commits every queued food"""
+        if not self.pending:
+            return
+        records = list(self.pending.values())
+        self.pending = {}
+        cursor = self.conn.cursor()
+        try:
+            with timed(self.metrics, 'db_write'):
+                self.write_batch(cursor, records)
+            with timed(self.metrics, 'commit'):
+                if self.on_commit:
+                    self.on_commit(cursor, [])
+                self.conn.commit()
+            self.saved_count += len(records)
+        except Exception as e:
+            self.conn.rollback()
+            if self.metrics is not None:
+                self.metrics.increment('batch_retries')
+            print(f"Error saving batch of {len(records)} foods, retrying one by one: {e}")
+            failed_codes = []
+            for record in records:
+                try:
+                    self.write_batch(cursor, [record])
+                    self.conn.commit()
+                    self.saved_count += 1
+                except Exception as e:
+                    self.conn.rollback()
+                    self.failed_count += 1
+                    failed_codes.append(record[0])
+                    if self.metrics is not None:
+                        self.metrics.increment('db_errors')
+                    print(f"Error saving {record[0]} to database: {e}")
+            if self.on_commit:
+                self.on_commit(cursor, failed_codes)
+                self.conn.commit()
+        finally:
+            cursor.close()
+
+    def write_batch(self, cursor, records):
+        # Upsert foods and resolve their ids
+        food_ids = dict(execute_values(cursor, """
+            INSERT INTO foods (code, name, "group", content_hash) VALUES %s
+            ON CONFLICT (code) DO UPDATE
+            SET name = EXCLUDED.name, "group" = EXCLUDED."group", content_hash = EXCLUDED.content_hash
+            RETURNING code, id
+        """, [record[:4] for record in records], page_size=len(records), fetch=True))
+
+        # Reuse the first variation of foods that already have one
+        cursor.execute("""
+            SELECT DISTINCT ON (food_id) food_id, id FROM food_variations
+            WHERE food_id = ANY(%s) ORDER BY food_id, id
+        """, (list(food_ids.values()),))
+        variation_ids = dict(cursor.fetchall())
+
+        existing = [(variation_ids[food_ids[record[0]]], record[4])
+                    for record in records if food_ids[record[0]] in variation_ids]
+        if existing:
+            execute_values(cursor, """
+                UPDATE food_variations AS fv SET description = v.description
+                FROM (VALUES %s) AS v (id, description) WHERE fv.id = v.id
+            """, existing, page_size=len(existing))
+            existing_ids = [variation_id for variation_id, _ in existing]
+            cursor.execute("DELETE FROM food_nutrients WHERE variation_id = ANY(%s)", (existing_ids,))
+            cursor.execute("DELETE FROM food_variation_nutrients WHERE variation_id = ANY(%s)", (existing_ids,))
+
+        new = [(food_ids[record[0]], record[4])
+               for record in records if food_ids[record[0]] not in variation_ids]
+        if new:
+            variation_ids.update(execute_values(cursor, """
+                INSERT INTO food_variations (food_id, description) VALUES %s
+                RETURNING food_id, id
+            """, new, page_size=len(new), fetch=True))
+
+        # Nutrients for both tables, written with COPY
+        legacy = []
+        column_rows = []
+        for code, _, _, _, _, legacy_rows, nutrient_values in records:
+            variation_id = variation_ids[food_ids[code]]
+            legacy.extend((variation_id,) + tuple(row) for row in legacy_rows)
+            column_rows.append([variation_id] + nutrient_values)
+
+        copy_rows(cursor, 'food_nutrients',
+                  ['variation_id', 'component', 'unit_of_measurement', 'value_per_100g'], legacy)
+        copy_rows(cursor, 'food_variation_nutrients', ['variation_id'] + COLUMNS, column_rows)
@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+
+
+class Checkpoint:
+    """Progress of a scrape run, persisted so an interrupted run can resume.
+
+    Tracks the parsed listing pages (and therefore the work queue), the
+    food codes whose output has been committed and the size of the output
+    file at the last commit. The output is a snapshot.SnapshotWriter (or
+    None when no file is written). A run that reaches its end with errors
+    keeps its checkpoint marked as finished, and the next run starts over
+    instead of resuming it. Subclasses decide where the state is stored.
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self.pages = {}
+        self.completed = set()
+        self.pending = []
+        self.file_offset = None
+        self.listing_errors = 0
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def start(self, resume=True):
+        """Loads the previous state when resuming, otherwise starts a new checkpoint.
+
+        Returns True when an interrupted run is being resumed. A finished
+        run is never resumed: its listing pages may be stale and its
+        snapshot is already published. The output is opened too: when
+        resuming, whatever was written after the last commit of that run
+        is truncated from it.
+        """
+        if resume and self.load() and not self.finished:
+            if self.output:
+                self.output.open(self.file_offset or 0)
+            return True
+        if self.output:
+            self.output.open()
+        self.clear()
+        self.pages = {}
+        self.completed = set()
+        self.pending = []
+        self.finished = False
+        self.commit()
+        return False
+
+    def current_file_offset(self):
+        if self.output:
+            return self.output.flush()
+        return 0
+
+    def get_page(self, page):
+        """Returns the stored (food_codes, has_next, last_page) of a listing page, or None"""
+        with self.lock:
+            result = self.pages.get(page)
+        if result is None:
+            return None
+        return [tuple(item) for item in result['food_codes']], result['has_next'], result['last_page']
+
+    def record_page(self, page, result):
+        food_codes, has_next, last_page = result
+        entry = {'food_codes': [list(item) for item in food_codes], 'has_next': has_next, 'last_page': last_page}
+        with self.lock:
+            self.pages[page] = entry
+            self.save_page(page, entry)
+
+    def mark_done(self, food_code):
+        """Marks a food as processed; it becomes durable at the next commit"""
+        self.pending.append(food_code)
+
+    def commit(self, cursor=None, failed_codes=()):
+        """Persists the pending completed codes and the current output file size.
+
+        failed_codes were marked done but could not be saved (e.g. their
+        database write failed); they are left out, so a resumed run
+        fetches them again.
+        """
+        if failed_codes:
+            failed_codes = set(failed_codes)
+            self.pending = [code for code in self.pending if code not in failed_codes]
+        self.file_offset = self.current_file_offset()
+        self.save_progress(self.pending, self.file_offset, cursor)
+        # Listing threads read completed while saving pages
+        with self.lock:
+            self.completed.update(self.pending)
+        self.pending = []
+
+    def finish(self):
+        """Records that the run reached its end, so the next run starts over"""
+        self.finished = True
+        self.save_finished()
+
+    def load(self):
+        raise NotImplementedError
+
+    def save_page(self, page, entry):
+        raise NotImplementedError
+
+    def save_progress(self, codes, file_offset, cursor=None):
+        raise NotImplementedError
+
+    def save_finished(self):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class FileCheckpoint(Checkpoint):
+    """Checkpoint stored as a JSON file that is replaced atomically on every update"""
+
+    def __init__(self, path="data/scrape_checkpoint.json", output=None):
+        super().__init__(output)
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return False
+        self.pages = {int(page): entry for page, entry in state['pages'].items()}
+        self.completed = set(state['completed'])
+        self.file_offset = state['file_offset']
+        self.finished = state.get('finished', False)
+        return True
+
+    def write(self, completed):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = {'pages': self.pages, 'completed': sorted(completed), 'file_offset': self.file_offset,
+                 'finished': self.finished}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding='utf-8') as file:
+            json.dump(state, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+    def save_page(self, page, entry):
+        self.write(self.completed)
+
+    def save_progress(self, codes, file_offset, cursor=None):
+        with self.lock:
+            self.write(self.completed | set(codes))
+
+    def save_finished(self):
+        with self.lock:
+            self.write(self.completed)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class DatabaseCheckpoint(Checkpoint):
+    """Checkpoint stored in the scrape_checkpoint table.
+
+    Completed codes are written with the cursor of the batch being
+    committed, so they become durable in the same transaction as the
+    foods themselves. Listing pages are recorded on a separate
+    autocommit connection because they are parsed on the crawler thread.
+    """
+
+    def __init__(self, conn, page_conn, output=None):
+        super().__init__(output)
+        self.conn = conn
+        self.page_conn = page_conn
+        self.page_conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_checkpoint (
+                    kind VARCHAR(10) NOT NULL,
+                    key VARCHAR(50) NOT NULL,
+                    value TEXT,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+        self.conn.commit()
+
+    def load(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT kind, key, value FROM scrape_checkpoint")
+            rows = cursor.fetchall()
+        self.conn.commit()
+        if not rows:
+            return False
+        for kind, key, value in rows:
+            if kind == 'page':
+                self.pages[int(key)] = json.loads(value)
+            elif kind == 'done':
+                self.completed.add(key)
+            elif kind == 'state' and key == 'file_offset':
+                self.file_offset = int(value)
+            elif kind == 'state' and key == 'finished':
+                self.finished = True
+        return True
+
+    def save_page(self, page, entry):
+        with self.page_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO scrape_checkpoint (kind, key, value) VALUES ('page', %s, %s)
+                ON CONFLICT (kind, key) DO UPDATE SET value = EXCLUDED.value
+            """, (str(page), json.dumps(entry, ensure_ascii=False)))
+
+    def save_progress(self, codes, file_offset, cursor=None):
+        own_cursor = cursor is None
+        if own_cursor:
+            cursor = self.conn.cursor()
+        if codes:
+            cursor.execute("""
+                INSERT INTO scrape_checkpoint (kind, key)
+                SELECT 'done', code FROM unnest(%s::text[]) AS code
+                ON CONFLICT (kind, key) DO NOTHING
+            """, (list(codes),))
+        cursor.execute("""
+            INSERT INTO scrape_checkpoint (kind, key, value) VALUES ('state', 'file_offset', %s)
+            ON CONFLICT (kind, key) DO UPDATE SET value = EXCLUDED.value
+        """, (str(file_offset),))
+        if own_cursor:
+            cursor.close()
+            self.conn.commit()
+
+    def save_finished(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO scrape_checkpoint (kind, key) VALUES ('state', 'finished')
+                ON CONFLICT (kind, key) DO NOTHING
+            """)
+        self.conn.commit()
+
+    def clear(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("DELETE FROM scrape_checkpoint")
+        self.conn.commit()
@@ -0,0 +1,172 @@
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from nutrients import COLUMNS, normalize, process_description
+from snapshot import SNAPSHOT_PATH, iter_lines
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_DIR = "data/export"
+INDEX_COLUMNS = ['code', 'name', 'group', 'description']
+
+
+class NutrientTable:
+    """Food variations as rows and the nutrient COLUMNS as a float64 matrix, with NaN for missing values.
+
+    Rows are looked up by food code, so every code must have exactly one
+    variation, which is what the scraper and the loaders store.
+    """
+
+    def __init__(self, codes, names, groups, descriptions, values, columns=COLUMNS):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.groups = list(groups)
+        self.descriptions = list(descriptions)
+        self.values = values
+        self.columns = list(columns)
+        self.row_index = {code: row for row, code in enumerate(self.codes)}
+        self.column_index = {column: index for index, column in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, name):
+        """Returns one nutrient for every row (a view, not a copy)"""
+        return self.values[:, self.column_index[name]]
+
+    def row(self, code):
+        """Returns the nutrient vector of a food code"""
+        return self.values[self.row_index[code]]
+
+
+def table_from_file(path=SNAPSHOT_PATH):
+    """Builds the table from a snapshot or a JSONL dump; the last line of a code wins, rows are sorted by code"""
+    foods = {}
+    for line in iter_lines(path):
+        try:
+            food_json = json.loads(line)
+            foods[food_json['code']] = food_json
+        except (ValueError, KeyError) as e:
+            print(f"Error processing line: {e}")
+
+    codes, names, groups, descriptions = [], [], [], []
+    values = np.full((len(foods), len(COLUMNS)), np.nan)
+    for row, code in enumerate(sorted(foods)):
+        food_json = foods[code]
+        name, description = process_description(food_json['description'])
+        codes.append(code)
+        names.append(name)
+        groups.append(food_json['class'])
+        descriptions.append(description)
+        values[row] = [np.nan if value is None else value for value in normalize(food_json['nutrients'])[1]]
+    return NutrientTable(codes, names, groups, descriptions, values)
+
+
+def table_from_db(conn):
+    """Builds the table from food_variation_nutrients, one row per variation, sorted by code.
+
+    Raises ValueError when a food has several variations, since rows are
+    looked up by code.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT f.code, f.name, f."group", fv.description, {', '.join(f'fvn.{column}' for column in COLUMNS)}
+            FROM foods f
+            JOIN food_variations fv ON f.id = fv.food_id
+            JOIN food_variation_nutrients fvn ON fv.id = fvn.variation_id
+            ORDER BY f.code, fv.id
+        """)
+        rows = cursor.fetchall()
+    conn.commit()
+    codes = [row[0] for row in rows]
+    if len(set(codes)) != len(codes):
+        duplicates = sorted(code for code, count in Counter(codes).items() if count > 1)
+        raise ValueError(f"Foods with several variations cannot be keyed by code: {', '.join(duplicates[:10])}")
+    # NULL arrives as None, which float64 conversion turns into NaN
+    values = np.array([row[4:] for row in rows], dtype=np.float64).reshape(len(rows), len(COLUMNS))
+    return NutrientTable(codes, [row[1] for row in rows], [row[2] for row in rows],
+                         [row[3] for row in rows], values)
+
+
+def _replace(temp_path, path):
+    os.replace(temp_path, path)
+    return path
+
+
+def export_table(table, directory=EXPORT_DIR, formats=None):
+    """Writes the table to `directory` and returns the written paths.
+
+    "npy" writes nutrients.npy (the float64 matrix) and index.json (the
+    column names and the code, name, group and description of every row),
+    which load_table memory-maps without copying. "parquet" writes
+    foods.parquet with the same data and needs pyarrow. By default both
+    are written, or only "npy" when pyarrow is not installed.
+    """
+    if formats is None:
+        formats = ("parquet", "npy") if pa is not None else ("npy",)
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for export_format in formats:
+        if export_format == "npy":
+            temp_path = os.path.join(directory, "nutrients.tmp.npy")
+            np.save(temp_path, np.ascontiguousarray(table.values, dtype=np.float64))
+            written.append(_replace(temp_path, os.path.join(directory, "nutrients.npy")))
+            temp_path = os.path.join(directory, "index.json.tmp")
+            with open(temp_path, "w", encoding='utf-8') as file:
+                json.dump({'columns': table.columns, 'code': table.codes, 'name': table.names,
+                           'group': table.groups, 'description': table.descriptions}, file, ensure_ascii=False)
+            written.append(_replace(temp_path, os.path.join(directory, "index.json")))
+        elif export_format == "parquet":
+            if pa is None:
+                raise ImportError("pyarrow is required for the Parquet export (pip install pyarrow)")
+            arrays = [pa.array(table.codes), pa.array(table.names), pa.array(table.groups),
+                      pa.array(table.descriptions)]
+            # Missing values are written as nulls rather than NaN
+            arrays += [pa.array(table.values[:, index], from_pandas=True) for index in range(len(table.columns))]
+            arrow_table = pa.Table.from_arrays(arrays, names=INDEX_COLUMNS + table.columns)
+            temp_path = os.path.join(directory, "foods.parquet.tmp")
+            pq.write_table(arrow_table, temp_path)
+            written.append(_replace(temp_path, os.path.join(directory, "foods.parquet")))
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+    return written
+
+
+def load_table(directory=EXPORT_DIR, mmap=True):
+    """Loads an exported table, memory-mapping nutrients.npy when it exists and reading foods.parquet otherwise"""
+    matrix_path = os.path.join(directory, "nutrients.npy")
+    if os.path.exists(matrix_path):
+        with open(os.path.join(directory, "index.json"), "r", encoding='utf-8') as file:
+            index = json.load(file)
+        values = np.load(matrix_path, mmap_mode='r' if mmap else None)
+        return NutrientTable(index['code'], index['name'], index['group'], index['description'], values,
+                             index['columns'])
+
+    if pq is None:
+        raise ImportError("pyarrow is required to read foods.parquet (pip install pyarrow)")
+    arrow_table = pq.read_table(os.path.join(directory, "foods.parquet"))
+    columns = [name for name in arrow_table.column_names if name not in INDEX_COLUMNS]
+    values = np.column_stack([
+        arrow_table.column(column).to_numpy(zero_copy_only=False).astype(np.float64) for column in columns
+    ]) if len(arrow_table) else np.empty((0, len(columns)))
+    return NutrientTable(*(arrow_table.column(name).to_pylist() for name in INDEX_COLUMNS), values, columns)
+
+
+def export_file(path=SNAPSHOT_PATH, directory=EXPORT_DIR, formats=None):
+    """Exports a snapshot (or JSONL dump) to the columnar formats"""
+    table = table_from_file(path)
+    written = export_table(table, directory, formats)
+    print(f"Exported {len(table)} foods x {len(table.columns)} nutrients to {', '.join(written)}")
+    return written
+
+
+if __name__ == "__main__":
+    export_file()
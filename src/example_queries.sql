@@ -1,18 +1,12 @@
 -- Example queries for the new column-based nutrient database
+-- Queries 1-8 read the food_profiles read model (one row per food variation,
+-- no joins); see src/read_model.py. Query 9 uses the base tables.
 
 -- 1. Get basic food information with all its nutrients
 SELECT 
-    f.code, 
-    f.name, 
-    f.group,
-    fv.description,
-    fvn.*
+    f.*
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
     f.code = 'BRC0001C'  -- Replace with any food code you want to query
 LIMIT 1;
@@ -21,118 +15,94 @@ LIMIT 1;
 SELECT 
     f.name, 
     f.group,
-    fvn.proteina_g
+    f.proteina_g
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
-    fvn.proteina_g IS NOT NULL
+    f.proteina_g IS NOT NULL
 ORDER BY 
-    fvn.proteina_g DESC
+    f.proteina_g DESC
 LIMIT 10;
 
 -- 3. Get foods with high vitamin C and low fat
 SELECT 
     f.name, 
     f.group,
-    fvn.vitamina_c_mg,
-    fvn.lipidios_g
+    f.vitamina_c_mg,
+    f.lipidios_g
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
-    fvn.vitamina_c_mg > 50  -- High vitamin C (>50mg)
-    AND fvn.lipidios_g < 3  -- Low fat (<3g)
-    AND fvn.vitamina_c_mg IS NOT NULL
-    AND fvn.lipidios_g IS NOT NULL
+    f.vitamina_c_mg > 50  -- High vitamin C (>50mg)
+    AND f.lipidios_g < 3  -- Low fat (<3g)
+    AND f.vitamina_c_mg IS NOT NULL
+    AND f.lipidios_g IS NOT NULL
 ORDER BY 
-    fvn.vitamina_c_mg DESC;
+    f.vitamina_c_mg DESC;
 
 -- 4. Calculate energy distribution (percentage of calories from each macronutrient)
 SELECT 
     f.name,
     f.group,
-    fvn.energia_kcal,
-    fvn.proteina_g,
-    fvn.carboidrato_total_g,
-    fvn.lipidios_g,
-    ROUND((fvn.proteina_g * 4 * 100) / NULLIF(fvn.energia_kcal, 0), 1) AS protein_percent,
-    ROUND((fvn.carboidrato_total_g * 4 * 100) / NULLIF(fvn.energia_kcal, 0), 1) AS carb_percent,
-    ROUND((fvn.lipidios_g * 9 * 100) / NULLIF(fvn.energia_kcal, 0), 1) AS fat_percent
+    f.energia_kcal,
+    f.proteina_g,
+    f.carboidrato_total_g,
+    f.lipidios_g,
+    ROUND((f.proteina_g * 4 * 100) / NULLIF(f.energia_kcal, 0), 1) AS protein_percent,
+    ROUND((f.carboidrato_total_g * 4 * 100) / NULLIF(f.energia_kcal, 0), 1) AS carb_percent,
+    ROUND((f.lipidios_g * 9 * 100) / NULLIF(f.energia_kcal, 0), 1) AS fat_percent
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
-    fvn.energia_kcal IS NOT NULL 
-    AND fvn.proteina_g IS NOT NULL
-    AND fvn.carboidrato_total_g IS NOT NULL
-    AND fvn.lipidios_g IS NOT NULL
-    AND fvn.energia_kcal > 0
+    f.energia_kcal IS NOT NULL 
+    AND f.proteina_g IS NOT NULL
+    AND f.carboidrato_total_g IS NOT NULL
+    AND f.lipidios_g IS NOT NULL
+    AND f.energia_kcal > 0
 LIMIT 20;
 
 -- 5. Find foods rich in specific minerals (calcium and iron)
 SELECT 
     f.name, 
     f.group,
-    fvn.calcio_mg,
-    fvn.ferro_mg
+    f.calcio_mg,
+    f.ferro_mg
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
-    fvn.calcio_mg > 100  -- Good calcium source (>100mg)
-    AND fvn.ferro_mg > 1.8  -- Good iron source (>1.8mg)
-    AND fvn.calcio_mg IS NOT NULL
-    AND fvn.ferro_mg IS NOT NULL
+    f.calcio_mg > 100  -- Good calcium source (>100mg)
+    AND f.ferro_mg > 1.8  -- Good iron source (>1.8mg)
+    AND f.calcio_mg IS NOT NULL
+    AND f.ferro_mg IS NOT NULL
 ORDER BY 
-    (fvn.calcio_mg + fvn.ferro_mg * 50) DESC;  -- Weighted sorting for both nutrients
+    (f.calcio_mg + f.ferro_mg * 50) DESC;  -- Weighted sorting for both nutrients
 
 -- 6. Foods low in sodium (for low-sodium diets)
 SELECT 
     f.name, 
     f.group,
-    fvn.sodio_mg
+    f.sodio_mg
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
-    fvn.sodio_mg < 140  -- Low sodium (<140mg per 100g)
-    AND fvn.sodio_mg IS NOT NULL
-    AND fvn.sodio_mg >= 0
+    f.sodio_mg < 140  -- Low sodium (<140mg per 100g)
+    AND f.sodio_mg IS NOT NULL
+    AND f.sodio_mg >= 0
 ORDER BY 
-    fvn.sodio_mg ASC;
+    f.sodio_mg ASC;
 
 -- 7. Comparison of similar foods (e.g., different types of fruits)
 SELECT 
     f.name,
-    fvn.carboidrato_total_g AS carbs,
-    fvn.fibra_alimentar_g AS fiber,
-    fvn.vitamina_c_mg AS vit_c
+    f.carboidrato_total_g AS carbs,
+    f.fibra_alimentar_g AS fiber,
+    f.vitamina_c_mg AS vit_c
 FROM 
-    foods f
-JOIN 
-    food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
+    food_profiles f
 WHERE 
     f.group = 'Frutas e derivados'
-    AND fvn.carboidrato_total_g IS NOT NULL
-    AND fvn.fibra_alimentar_g IS NOT NULL
+    AND f.carboidrato_total_g IS NOT NULL
+    AND f.fibra_alimentar_g IS NOT NULL
 ORDER BY 
     f.name ASC;
 
@@ -140,24 +110,38 @@ ORDER BY
 SELECT 
     f.name,
     f.group,
-    fvn.energia_kcal,
+    f.energia_kcal,
     (
-        COALESCE(fvn.proteina_g, 0) + 
-        COALESCE(fvn.fibra_alimentar_g, 0) * 2 + 
-        COALESCE(fvn.vitamina_c_mg/60, 0) + 
-        COALESCE(fvn.ferro_mg/8, 0) + 
-        COALESCE(fvn.calcio_mg/800, 0) + 
-        COALESCE(fvn.vitamina_a_re_mcg/800, 0)
-    ) / NULLIF(fvn.energia_kcal/100, 0) AS nutrient_density_score
+        COALESCE(f.proteina_g, 0) + 
+        COALESCE(f.fibra_alimentar_g, 0) * 2 + 
+        COALESCE(f.vitamina_c_mg/60, 0) + 
+        COALESCE(f.ferro_mg/8, 0) + 
+        COALESCE(f.calcio_mg/800, 0) + 
+        COALESCE(f.vitamina_a_re_mcg/800, 0)
+    ) / NULLIF(f.energia_kcal/100, 0) AS nutrient_density_score
+FROM 
+    food_profiles f
+WHERE 
+    f.energia_kcal > 0
+    AND f.energia_kcal IS NOT NULL
+ORDER BY 
+    nutrient_density_score DESC
+LIMIT 20;
+
+-- 9. Accent-insensitive name search with typo tolerance
+-- (needs search_fold and the pg_trgm indexes of docker/scripts/create_search_indexes.sql)
+SELECT 
+    f.code,
+    f.name,
+    fv.description,
+    similarity(search_fold(f.name), search_fold('feijao')) AS score
 FROM 
     foods f
 JOIN 
     food_variations fv ON f.id = fv.food_id
-JOIN 
-    food_variation_nutrients fvn ON fv.id = fvn.variation_id
 WHERE 
-    fvn.energia_kcal > 0
-    AND fvn.energia_kcal IS NOT NULL
+    search_fold(f.name) % search_fold('feijao')
+    OR search_fold(f.name) LIKE '%' || search_fold('feijao') || '%'
 ORDER BY 
-    nutrient_density_score DESC
-LIMIT 20;
+    score DESC, f.name
+LIMIT 10;
@@ -0,0 +1,210 @@
+from bs4 import BeautifulSoup, UnicodeDammit
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+FOOD_LINK_MARKER = 'int_composicao_alimentos.php?cod_produto='
+NEXT_PAGE_TEXT = 'próxima »'
+# Declared encodings that browsers read as windows-1252
+LATIN1_ENCODINGS = {'iso-8859-1', 'latin-1', 'latin1', 'l1'}
+
+
+def _food_json(food_code, food_class, description, nutrients):
+    return {
+        'code': food_code,
+        'class': food_class,
+        'description': description,
+        'nutrients': nutrients
+    }
+
+
+def decode_page(content):
+    """Decodes a page with UnicodeDammit, reading pages declared as ISO-8859-1 as windows-1252 like browsers do.
+
+    Old PHP pages often declare ISO-8859-1 but contain windows-1252 curly
+    quotes and dashes, which would otherwise become C1 control characters.
+    """
+    if not isinstance(content, bytes):
+        return content
+    if not content.strip():
+        return ''
+    dammit = UnicodeDammit(content, is_html=True)
+    if (dammit.original_encoding or '').lower() in LATIN1_ENCODINGS:
+        try:
+            return content.decode('cp1252')
+        except UnicodeDecodeError:
+            pass
+    return dammit.unicode_markup
+
+
+def _page_number(href):
+    page = href.split('page=')[1].split('&')[0]
+    return int(page) if page.isdigit() else None
+
+
+class BeautifulSoupExtractor:
+    """Reference extractor built on BeautifulSoup's html.parser"""
+
+    name = 'html.parser'
+
+    def parse_food_page(self, content, food_code, food_class):
+        """Parses a food detail page into the food JSON structure"""
+        soup = BeautifulSoup(decode_page(content), 'html.parser')
+
+        # Extract food description
+        description = "Description not found"
+        description_elem = soup.find('h2') or soup.find('h1') or soup.find('title')
+        if description_elem:
+            description = description_elem.get_text().strip()
+
+        # Extract nutrients table
+        nutrients = []
+        table = soup.find('table')
+        if table:
+            rows = table.find_all('tr')[1:]  # Skip header
+            for row in rows:
+                columns = row.find_all('td')
+                if len(columns) >= 3:
+                    nutrient = {
+                        'Component': columns[0].get_text().strip(),
+                        'Units': columns[1].get_text().strip(),
+                        'Value per 100g': columns[2].get_text().strip()
+                    }
+                    nutrients.append(nutrient)
+
+        return _food_json(food_code, food_class, description, nutrients)
+
+    def parse_listing_page(self, content):
+        """Returns the (food_code, food_class) tuples, whether a next page exists and the last page number"""
+        soup = BeautifulSoup(decode_page(content), 'html.parser')
+
+        # Search for food links on the page
+        food_codes = []
+        food_links = soup.find_all('a', href=lambda x: x and FOOD_LINK_MARKER in x)
+        for link in food_links:
+            href = link.get('href')
+            food_code = href.split('cod_produto=')[1].split('&')[0]
+            # Extract food class (if available in context)
+            food_class = link.find_parent('tr').find_all('td')[3].get_text().strip()
+            food_codes.append((food_code, food_class))
+
+        # Find the link to the next page
+        has_next = soup.find('a', string=NEXT_PAGE_TEXT) is not None
+
+        # The pagination links tell how many pages there are
+        last_page = None
+        for link in soup.find_all('a', href=lambda x: x and 'page=' in x):
+            page = _page_number(link.get('href'))
+            if page is not None:
+                last_page = max(last_page or 0, page)
+
+        return food_codes, has_next, last_page
+
+
+class LxmlExtractor:
+    """Fast extractor using lxml's C HTML parser.
+
+    Produces the same output as BeautifulSoupExtractor: the document is
+    decoded by the same decode_page, elements are searched in
+    document order and text is gathered from all descendants.
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("The lxml extractor requires the lxml package")
+
+    def parse(self, content):
+        content = decode_page(content)
+        # etree.HTML uses lxml's per-thread default parser, so workers can share the extractor
+        root = etree.HTML(content) if content.strip() else None
+        return root if root is not None else etree.HTML('<html></html>')
+
+    @staticmethod
+    def text(element):
+        return ''.join(element.itertext()).strip()
+
+    @staticmethod
+    def string(element):
+        # Mirrors BeautifulSoup's Tag.string: the text of a tag whose only child is a single string
+        while True:
+            if element.text and len(element) == 0:
+                return element.text
+            if not element.text and len(element) == 1 and not element[0].tail:
+                element = element[0]
+                continue
+            return None
+
+    @staticmethod
+    def first(root, *tags):
+        for tag in tags:
+            element = next(root.iter(tag), None)
+            if element is not None:
+                return element
+        return None
+
+    def parse_food_page(self, content, food_code, food_class):
+        """Parses a food detail page into the food JSON structure"""
+        root = self.parse(content)
+
+        description = "Description not found"
+        description_elem = self.first(root, 'h2', 'h1', 'title')
+        if description_elem is not None:
+            description = self.text(description_elem)
+
+        nutrients = []
+        table = next(root.iter('table'), None)
+        if table is not None:
+            rows = list(table.iter('tr'))[1:]  # Skip header
+            for row in rows:
+                columns = list(row.iter('td'))
+                if len(columns) >= 3:
+                    nutrients.append({
+                        'Component': self.text(columns[0]),
+                        'Units': self.text(columns[1]),
+                        'Value per 100g': self.text(columns[2])
+                    })
+
+        return _food_json(food_code, food_class, description, nutrients)
+
+    def parse_listing_page(self, content):
+        """Returns the (food_code, food_class) tuples, whether a next page exists and the last page number"""
+        root = self.parse(content)
+
+        food_codes = []
+        has_next = False
+        last_page = None
+        for link in root.iter('a'):
+            href = link.get('href') or ''
+            if FOOD_LINK_MARKER in href:
+                food_code = href.split('cod_produto=')[1].split('&')[0]
+                row = next(link.iterancestors('tr'))
+                food_class = self.text(list(row.iter('td'))[3])
+                food_codes.append((food_code, food_class))
+            if 'page=' in href:
+                page = _page_number(href)
+                if page is not None:
+                    last_page = max(last_page or 0, page)
+            if not has_next and self.string(link) == NEXT_PAGE_TEXT:
+                has_next = True
+
+        return food_codes, has_next, last_page
+
+
+EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def get_extractor(name='auto'):
+    """Returns an extractor by name; 'auto' picks lxml when it is installed"""
+    if name == 'auto':
+        name = 'lxml' if etree is not None else 'html.parser'
+    try:
+        return EXTRACTORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown extractor '{name}', choose from {sorted(EXTRACTORS)}") from None
@@ -0,0 +1,306 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CacheMiss
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and consumes it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so every host gets its own request budget"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Connection resets, including ones in the middle of the body, and timeouts
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ContentDecodingError)
+
+
+def parse_retry_after(value):
+    """Converts a Retry-After header (seconds or HTTP date) to seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HTTPClient:
+    """Shared keep-alive session with retries, used by every scraper request.
+
+    The connection pool holds `pool_size` connections per host, so it should
+    be at least the number of workers. Requests that fail with one of
+    RETRY_EXCEPTIONS or RETRY_STATUSES are retried up to
+    `max_retries` times with jittered exponential backoff, waiting at least
+    as long as the server's Retry-After header asks.
+
+    With a ResponseCache, fresh entries are served from disk and stale ones
+    are revalidated with a conditional GET. offline=True never touches the
+    network and raises CacheMiss for URLs that are not cached.
+    """
+
+    def __init__(self, pool_size=10, timeout=(10, 30), max_retries=5, backoff_factor=0.5,
+                 max_backoff=60, rate_limiter=None, cache=None, offline=False):
+        if offline and cache is None:
+            raise ValueError("Offline mode requires a response cache")
+        self.cache = cache
+        self.offline = offline
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'failures': 0, 'bytes_received': 0,
+                         'cache_hits': 0, 'cache_revalidated': 0, 'cache_misses': 0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def backoff(self, attempt, retry_after=None):
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def get(self, url, params=None):
+        """GETs a URL through the cache (if any) and returns the response"""
+        if self.cache is None:
+            return self.request(url, params)
+        
+        url = requests.Request('GET', url, params=params).prepare().url
+        cached = self.cache.load(url)
+        if cached is not None and (self.offline or self.cache.is_fresh(cached[0])):
+            self.count('cache_hits')
+            return self.cache.response(url, *cached)
+        if self.offline:
+            self.count('cache_misses')
+            raise CacheMiss(f"{url} is not cached")
+        
+        headers = self.cache.conditional_headers(cached[0]) if cached is not None else None
+        response = self.request(url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self.count('cache_revalidated')
+            self.cache.refresh(url, cached[0])
+            return self.cache.response(url, *cached)
+        self.count('cache_misses')
+        self.cache.store(url, response)
+        return response
+
+    def request(self, url, params=None, headers=None):
+        """GETs a URL from the network, retrying transient failures"""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            self.count('requests')
+            retry_after = None
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    self.count('bytes_received', len(response.content))
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                error = requests.HTTPError(f"{response.status_code} for url: {response.url}", response=response)
+            except RETRY_EXCEPTIONS as e:
+                error = e
+            
+            if attempt >= self.max_retries:
+                self.count('failures')
+                raise error
+            self.count('retries')
+            time.sleep(self.backoff(attempt, retry_after))
+            attempt += 1
+
+    def stats(self):
+        """Returns request, retry, byte and connection reuse counters"""
+        opened = 0
+        served = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        with self.lock:
+            stats = dict(self.counters)
+        stats['connections_opened'] = opened
+        stats['connections_reused'] = max(0, served - opened)
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def fetch_concurrently(items, fetch, workers=8, ordered=True, max_pending=None):
+    """Runs fetch(item) on a thread pool and yields (item, result, error) tuples.
+
+    At most `max_pending` items are in flight at once, so a long input never
+    materializes all of its results in memory. With ordered=True results are
+    delivered in input order, otherwise as soon as they complete.
+    """
+    max_pending = max_pending or workers * 4
+
+    def call(item):
+        try:
+            return item, fetch(item), None
+        except Exception as e:
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(call, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for item in items:
+                pending.add(executor.submit(call, item))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+_DONE = object()
+
+
+def fetch_pipelined(items, fetch, workers=8, queue_size=None, ordered=True):
+    """Streams items from a producer straight into fetch workers.
+
+    `items` is consumed on its own thread (e.g. a listing crawler generator)
+    and every item is handed to the workers as soon as it is produced. Both
+    the work queue and the result queue are bounded, so a slow consumer
+    throttles the workers and slow workers throttle the producer. At most
+    queue_size items are handed out before the caller takes them, so in
+    ordered mode a slow item at the head holds back the producer instead
+    of letting later results pile up in memory; ordered=False avoids that
+    head-of-line wait when the order does not matter. Yields
+    (item, result, error) tuples like fetch_concurrently; an exception
+    raised by the producer ends the stream and is re-raised to the caller.
+    """
+    queue_size = queue_size or workers * 4
+    work_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    # One slot per item handed out and not yet yielded
+    slots = threading.Semaphore(queue_size)
+    producer_error = []
+
+    def produce():
+        try:
+            for sequence, item in enumerate(items):
+                slots.acquire()
+                work_queue.put((sequence, item))
+        except Exception as e:
+            producer_error.append(e)
+        finally:
+            for _ in range(workers):
+                work_queue.put(_DONE)
+
+    def consume():
+        while True:
+            task = work_queue.get()
+            if task is _DONE:
+                result_queue.put(_DONE)
+                return
+            sequence, item = task
+            try:
+                result_queue.put((sequence, (item, fetch(item), None)))
+            except Exception as e:
+                result_queue.put((sequence, (item, None, e)))
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    finished_workers = 0
+    next_sequence = 0
+    out_of_order = {}
+    while finished_workers < workers:
+        entry = result_queue.get()
+        if entry is _DONE:
+            finished_workers += 1
+            continue
+        sequence, result = entry
+        if not ordered:
+            slots.release()
+            yield result
+            continue
+        out_of_order[sequence] = result
+        while next_sequence in out_of_order:
+            slots.release()
+            yield out_of_order.pop(next_sequence)
+            next_sequence += 1
+
+    for thread in threads:
+        thread.join()
+    for sequence in sorted(out_of_order):
+        yield out_of_order[sequence]
+    if producer_error:
+        raise producer_error[0]
@@ -0,0 +1,138 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Field weights: a match in the food name counts more than one in its variation or group
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+# A token that only starts with the query scores less than an exact match
+PREFIX_FACTOR = 0.8
+# Typo tolerance: minimum trigram similarity and number of vocabulary tokens a typo may expand to
+FUZZY_SIMILARITY = 0.35
+FUZZY_EXPANSIONS = 5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# TBCA abbreviations, spelled out the way people type them ("s/ sal" -> "sem sal")
+ABBREVIATIONS = [(re.compile(r"\bs/"), " sem "), (re.compile(r"\bc/"), " com ")]
+# The words nutrients.process_description writes for those abbreviations
+SYNONYMS = {"without": "sem", "with": "com"}
+
+
+def fold(text):
+    """Lowercases text and strips accents ("Feijão" -> "feijao")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    text = fold(text)
+    for pattern, replacement in ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+    return [SYNONYMS.get(token, token) for token in TOKEN_PATTERN.findall(text)]
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodSearch:
+    """Accent-insensitive search over food names, variation descriptions and groups.
+
+    Everything is precomputed when the index is built: the postings of
+    every token and of every token prefix (for autocomplete), as arrays
+    of (food, weight), and a trigram index of the vocabulary for typos.
+    A query matches the foods that contain all of its words; the last
+    word also matches as a prefix, and a word that is not in the
+    vocabulary is replaced by its closest spellings. Results are ranked
+    by the summed field weights, then by shorter name and by code.
+    """
+
+    def __init__(self, codes, names, descriptions=None, groups=None):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.descriptions = list(descriptions) if descriptions is not None else [""] * len(self.codes)
+        self.groups = list(groups) if groups is not None else [""] * len(self.codes)
+        self.name_lengths = np.array([len(name) for name in self.names])
+        self.code_order = np.argsort(np.argsort(np.array(self.codes, dtype=object)))
+
+        weights = defaultdict(dict)
+        for food, fields in enumerate(zip(self.names, self.descriptions, self.groups)):
+            for text, weight in zip(fields, (NAME_WEIGHT, DESCRIPTION_WEIGHT, GROUP_WEIGHT)):
+                for token in tokenize(text or ""):
+                    postings = weights[token]
+                    postings[food] = max(postings.get(food, 0.0), weight)
+
+        self.tokens = {token: self._postings(postings) for token, postings in weights.items()}
+        prefixes = defaultdict(dict)
+        for token, postings in weights.items():
+            for length in range(1, len(token) + 1):
+                factor = 1.0 if length == len(token) else PREFIX_FACTOR
+                prefix_postings = prefixes[token[:length]]
+                for food, weight in postings.items():
+                    prefix_postings[food] = max(prefix_postings.get(food, 0.0), weight * factor)
+        self.prefixes = {prefix: self._postings(postings) for prefix, postings in prefixes.items()}
+
+        self.vocabulary = sorted(weights)
+        self.vocabulary_trigrams = [trigrams(token) for token in self.vocabulary]
+        self.trigram_index = defaultdict(list)
+        for index, token_trigrams in enumerate(self.vocabulary_trigrams):
+            for trigram in token_trigrams:
+                self.trigram_index[trigram].append(index)
+
+    @staticmethod
+    def _postings(postings):
+        foods = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+        return foods, np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+
+    @classmethod
+    def from_table(cls, table):
+        """Builds the index from a columnar_export.NutrientTable"""
+        return cls(table.codes, table.names, table.descriptions, table.groups)
+
+    def similar_tokens(self, token):
+        """Returns [(vocabulary token, similarity)] of the closest spellings of a token"""
+        query_trigrams = trigrams(token)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigram_index.get(trigram, ()))
+        matches = []
+        for index, count in shared.items():
+            similarity = count / (len(query_trigrams) + len(self.vocabulary_trigrams[index]) - count)
+            if similarity >= FUZZY_SIMILARITY:
+                matches.append((similarity, self.vocabulary[index]))
+        matches.sort(reverse=True)
+        return [(candidate, similarity) for similarity, candidate in matches[:FUZZY_EXPANSIONS]]
+
+    def _token_scores(self, token, prefix):
+        postings = self.prefixes.get(token) if prefix else self.tokens.get(token)
+        if postings is not None:
+            return [postings]
+        return [(foods, weights * similarity)
+                for candidate, similarity in self.similar_tokens(token)
+                for foods, weights in [self.tokens[candidate]]]
+
+    def search(self, query, limit=10):
+        """Returns (code, name, description, score) of the best matches of a query, best first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        total = np.zeros(len(self.codes))
+        matched = None
+        for position, token in enumerate(tokens):
+            scores = np.zeros(len(self.codes))
+            for foods, weights in self._token_scores(token, prefix=position == len(tokens) - 1):
+                scores[foods] = np.maximum(scores[foods], weights)
+            total += scores
+            matched = scores > 0 if matched is None else matched & (scores > 0)
+
+        foods = np.flatnonzero(matched)
+        if len(foods) > limit:
+            # Keep every food tied with the limit-th score so ties are still ranked by name length and code
+            threshold = np.partition(total[foods], len(foods) - limit)[len(foods) - limit]
+            foods = foods[total[foods] >= threshold]
+        foods = foods[np.lexsort((self.code_order[foods], self.name_lengths[foods], -total[foods]))][:limit]
+        return [(self.codes[food], self.names[food], self.descriptions[food], float(total[food])) for food in foods]
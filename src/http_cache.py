@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL is not in the cache"""
+
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response built from a cache entry"""
+
+    def __init__(self, url, content, headers, status_code=200):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.status_code = status_code
+        self.from_cache = True
+
+    def raise_for_status(self):
+        pass
+
+
+class ResponseCache:
+    """On-disk cache of raw HTTP responses keyed by URL.
+
+    Each entry is a body file plus a JSON metadata file (ETag, Last-Modified,
+    fetch time) named after the SHA-256 of the URL. Entries younger than
+    `ttl` seconds are served without touching the network; older ones are
+    revalidated with a conditional GET. When the cache grows beyond
+    `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory="data/http_cache", ttl=None, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self.scan())
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        prefix = os.path.join(self.directory, key[:2], key)
+        return prefix + ".body", prefix + ".json"
+
+    def scan(self):
+        """Yields (key path prefix, entry size, last access time) for every entry"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-5] + ".body"
+                try:
+                    size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                    yield meta_path[:-5], size, os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+
+    def load(self, url):
+        """Returns (metadata, body) for a URL or None when it is not cached"""
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, "r", encoding='utf-8') as file:
+                meta = json.load(file)
+            with open(body_path, "rb") as file:
+                body = file.read()
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta, body
+
+    def is_fresh(self, meta):
+        return self.ttl is not None and time.time() - meta['fetched_at'] < self.ttl
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def response(self, url, meta, body):
+        return CachedResponse(url, body, meta.get('headers', {}))
+
+    def store(self, url, response):
+        """Writes a 200 response to the cache, replacing any previous entry atomically"""
+        body_path, meta_path = self.paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'headers': {'Content-Type': response.headers.get('Content-Type', '')},
+        }
+        old_size = self.entry_size(body_path, meta_path)
+        self.write_atomic(body_path, response.content)
+        self.write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        with self.lock:
+            self.total_bytes += self.entry_size(body_path, meta_path) - old_size
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def refresh(self, url, meta):
+        """Marks an entry as revalidated after a 304 Not Modified"""
+        _, meta_path = self.paths(url)
+        meta['fetched_at'] = time.time()
+        self.write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    @staticmethod
+    def entry_size(body_path, meta_path):
+        try:
+            return os.path.getsize(body_path) + os.path.getsize(meta_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def write_atomic(path, data):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """Removes least recently used entries until the cache is below 90% of max_bytes"""
+        with self.lock:
+            entries = sorted(self.scan(), key=lambda entry: entry[2])
+            target = self.max_bytes * 0.9
+            total = sum(size for _, size, _ in entries)
+            for prefix, size, _ in entries:
+                if total <= target:
+                    break
+                for suffix in (".json", ".body"):
+                    try:
+                        os.remove(prefix + suffix)
+                    except OSError:
+                        pass
+                total -= size
+            self.total_bytes = total
@@ -0,0 +1,242 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (in seconds) of the stage duration histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Duration histogram with fixed buckets, plus the count, sum, min and max"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimates a quantile as the upper bound of the bucket that holds it (max for the last one)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        def rounded(value):
+            return round(value, 6) if value is not None else None
+        return {'count': self.count, 'total_seconds': rounded(self.total),
+                'mean_seconds': rounded(self.total / self.count) if self.count else None,
+                'p50_seconds': rounded(self.quantile(0.5)), 'p95_seconds': rounded(self.quantile(0.95)),
+                'p99_seconds': rounded(self.quantile(0.99)), 'min_seconds': rounded(self.min),
+                'max_seconds': rounded(self.max)}
+
+
+class Metrics:
+    """Thread-safe stage timers and counters of one run.
+
+    Stages used by the scraper and the loaders: listing_fetch,
+    listing_parse, detail_fetch, parse, normalize, file_write, db_write
+    and commit. The results are available as a JSON run report and in
+    the Prometheus text format, optionally served over HTTP while the run
+    is going on.
+    """
+
+    def __init__(self, name="tbca"):
+        self.name = name
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.sources = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Times the block into a stage, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def update(self, counters):
+        """Sets counters kept elsewhere"""
+        with self.lock:
+            self.counters.update(counters)
+
+    def watch(self, source):
+        """Reads counters from source() (e.g. HTTPClient.stats) every time the metrics are rendered"""
+        self.sources.append(source)
+
+    def unwatch(self, source):
+        """Stops reading a source, keeping its last counters"""
+        self.sources.remove(source)
+        self.update(source())
+
+    def snapshot(self):
+        """Returns the stage histograms summaries and the counters"""
+        counters = {}
+        for source in list(self.sources):
+            counters.update(source())
+        with self.lock:
+            counters.update(self.counters)
+            stages = {stage: (histogram.summary(), list(histogram.counts)) for stage, histogram in self.stages.items()}
+        return stages, counters
+
+    def report(self):
+        elapsed = time.time() - self.started
+        stages, counters = self.snapshot()
+        foods = counters.get('foods_processed', 0)
+        return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'elapsed_seconds': round(elapsed, 3),
+                'foods_per_second': round(foods / elapsed, 2) if elapsed else None,
+                'stages': {stage: summary for stage, (summary, _) in stages.items()}, 'counters': counters}
+
+    def write_report(self, path):
+        """Writes the JSON run report"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+        return path
+
+    def prometheus_text(self):
+        """Renders the metrics in the Prometheus text exposition format"""
+        lines = []
+        stages, counters = self.snapshot()
+        metric = f"{self.name}_stage_duration_seconds"
+        lines.append(f"# HELP {metric} Time spent in each stage of the run.")
+        lines.append(f"# TYPE {metric} histogram")
+        for stage, (summary, counts) in sorted(stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {summary["total_seconds"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {summary["count"]}')
+        for counter, value in sorted(counters.items()):
+            lines.append(f"# TYPE {self.name}_{counter}_total counter")
+            lines.append(f"{self.name}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=""):
+        """Serves /metrics in the Prometheus format from a background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Serving metrics on http://{host or 'localhost'}:{self.server.server_port}/metrics")
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def timed(metrics, stage):
+    """Times a block into a stage of metrics, or does nothing when metrics is None"""
+    return metrics.timer(stage) if metrics is not None else nullcontext()
+
+
+class SampledProfiler:
+    """Profiles the work done for a sampled subset of foods with cProfile.
+
+    A food is sampled when the CRC32 of its code falls within `rate`, so
+    every stage of the same food makes the same decision. Profiled blocks
+    run one at a time, since only one profiler can be active at once on
+    recent Python versions. dump() merges all samples into one .prof file
+    for pstats or snakeviz.
+    """
+
+    def __init__(self, rate, path="data/profile.prof"):
+        self.rate = rate
+        self.path = path
+        self.stats = None
+        self.samples = set()
+        self.lock = threading.Lock()
+
+    def sampled(self, key):
+        return zlib.crc32(key.encode('utf-8')) % 1000000 < self.rate * 1000000
+
+    @contextmanager
+    def profile(self, key):
+        if not self.sampled(key):
+            yield
+            return
+        with self.lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.create_stats()
+                self.samples.add(key)
+                if self.stats is None:
+                    self.stats = pstats.Stats(profiler)
+                else:
+                    self.stats.add(profiler)
+
+    def dump(self):
+        """Writes the merged profile and returns its path, or None when nothing was sampled"""
+        if self.stats is None:
+            return None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.stats.dump_stats(self.path)
+        return self.path
+
+
+def profiled(profiler, key):
+    """Profiles a block when a profiler is given and samples the key"""
+    return profiler.profile(key) if profiler is not None else nullcontext()
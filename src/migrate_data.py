@@ -1,72 +1,52 @@
 import json
+import time
 import psycopg2
+from psycopg2.extras import execute_values
 from dbconnect import postgresql_connection
+from nutrients import COLUMNS, NAME_INDEX, NUTRIENTS, UNIT_INDEX
+from read_model import READ_MODEL, refresh_read_model
+
+# Values that nutrients.parse_value accepts (float() after replacing the decimal comma)
+NUMERIC_PATTERN = r'^[+-]?([0-9]+[.,]?[0-9]*|[.,][0-9]+)$'
+
+
+def upgrade_schema():
+    """Adds the columns the scraper writes to a database created by an older create_database.sql"""
+    
+    conn = postgresql_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Content hash of the scraped page, used by the delta scrape mode
+        cursor.execute("ALTER TABLE foods ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+        conn.commit()
+        print("Database schema is up to date")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error upgrading the database schema: {e}")
+    finally:
+        cursor.close()
+        conn.close()
 
 def populate_nutrients_table():
     """Populates the nutrients reference table with unique nutrients from the list"""
     
-    # List of nutrients with their units based on the provided data
-    nutrients = [
-        {"name": "Energia", "unit": "kJ", "category": "Energy"},
-        {"name": "Energia", "unit": "kcal", "category": "Energy"},
-        {"name": "Umidade", "unit": "g", "category": "Basic"},
-        {"name": "Carboidrato total", "unit": "g", "category": "Macronutrient"},
-        {"name": "Carboidrato disponível", "unit": "g", "category": "Macronutrient"},
-        {"name": "Proteína", "unit": "g", "category": "Macronutrient"},
-        {"name": "Lipídios", "unit": "g", "category": "Macronutrient"},
-        {"name": "Fibra alimentar", "unit": "g", "category": "Macronutrient"},
-        {"name": "Álcool", "unit": "g", "category": "Other"},
-        {"name": "Cinzas", "unit": "g", "category": "Other"},
-        {"name": "Colesterol", "unit": "mg", "category": "Lipid"},
-        {"name": "Ácidos graxos saturados", "unit": "g", "category": "Lipid"},
-        {"name": "Ácidos graxos monoinsaturados", "unit": "g", "category": "Lipid"},
-        {"name": "Ácidos graxos poliinsaturados", "unit": "g", "category": "Lipid"},
-        {"name": "Ácidos graxos trans", "unit": "g", "category": "Lipid"},
-        {"name": "Cálcio", "unit": "mg", "category": "Mineral"},
-        {"name": "Ferro", "unit": "mg", "category": "Mineral"},
-        {"name": "Sódio", "unit": "mg", "category": "Mineral"},
-        {"name": "Magnésio", "unit": "mg", "category": "Mineral"},
-        {"name": "Fósforo", "unit": "mg", "category": "Mineral"},
-        {"name": "Potássio", "unit": "mg", "category": "Mineral"},
-        {"name": "Manganês", "unit": "mg", "category": "Mineral"},
-        {"name": "Zinco", "unit": "mg", "category": "Mineral"},
-        {"name": "Cobre", "unit": "mg", "category": "Mineral"},
-        {"name": "Selênio", "unit": "mcg", "category": "Mineral"},
-        {"name": "Vitamina A (RE)", "unit": "mcg", "category": "Vitamin"},
-        {"name": "Vitamina A (RAE)", "unit": "mcg", "category": "Vitamin"},
-        {"name": "Vitamina D", "unit": "mcg", "category": "Vitamin"},
-        {"name": "Alfa-tocoferol (Vitamina E)", "unit": "mg", "category": "Vitamin"},
-        {"name": "Tiamina", "unit": "mg", "category": "Vitamin"},
-        {"name": "Riboflavina", "unit": "mg", "category": "Vitamin"},
-        {"name": "Niacina", "unit": "mg", "category": "Vitamin"},
-        {"name": "Vitamina B6", "unit": "mg", "category": "Vitamin"},
-        {"name": "Vitamina B12", "unit": "mcg", "category": "Vitamin"},
-        {"name": "Vitamina C", "unit": "mg", "category": "Vitamin"},
-        {"name": "Equivalente de folato", "unit": "mcg", "category": "Vitamin"},
-        {"name": "Sal de adição", "unit": "g", "category": "Other"},
-        {"name": "Açúcar de adição", "unit": "g", "category": "Other"}
-    ]
-    
     conn = postgresql_connection()
     cursor = conn.cursor()
     
     try:
-        # Insert nutrients
-        for nutrient in nutrients:
-            # Check if the nutrient already exists
-            cursor.execute(
-                "SELECT id FROM nutrients WHERE name = %s AND unit_of_measurement = %s",
-                (nutrient["name"], nutrient["unit"])
+        # Insert the nutrients that are missing in a single statement
+        execute_values(cursor, """
+            INSERT INTO nutrients (name, unit_of_measurement, category)
+            SELECT v.name, v.unit, v.category FROM (VALUES %s) AS v (name, unit, category)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM nutrients n WHERE n.name = v.name AND n.unit_of_measurement = v.unit
             )
-            
-            if cursor.fetchone() is None:
-                cursor.execute(
-                    "INSERT INTO nutrients (name, unit_of_measurement, category) VALUES (%s, %s, %s)",
-                    (nutrient["name"], nutrient["unit"], nutrient["category"])
-                )
+        """, [(nutrient["name"], nutrient["unit"], nutrient["category"]) for nutrient in NUTRIENTS],
+            page_size=len(NUTRIENTS))
         
         conn.commit()
-        print(f"Successfully populated nutrients table with {len(nutrients)} nutrients")
+        print(f"Successfully populated nutrients table with {len(NUTRIENTS)} nutrients")
     except Exception as e:
         conn.rollback()
         print(f"Error populating nutrients table: {e}")
@@ -74,118 +54,82 @@ def populate_nutrients_table():
         cursor.close()
         conn.close()
 
-def migrate_data():
-    """Migrates data from old food_nutrients to new food_variation_nutrients table"""
+def build_migration_query():
+    """Builds the INSERT ... SELECT that pivots food_nutrients rows into food_variation_nutrients columns.
+
+    Components are matched like nutrients.column_index: by (name, unit)
+    first and then by the name alone. Values are converted like
+    nutrients.parse_value, with anything else (e.g. "NA") stored as NULL.
+    Variations that already have a row are skipped, so the migration can
+    be re-run safely.
+    """
+    def quote(text):
+        return "'" + text.replace("'", "''") + "'"
+
+    by_unit = ", ".join(
+        f"({quote(name)}, {quote(unit)}, {quote(COLUMNS[index])})" for (name, unit), index in UNIT_INDEX.items()
+    )
+    by_name = ", ".join(f"({quote(name)}, {quote(COLUMNS[index])})" for name, index in NAME_INDEX.items())
+    pivot = ",\n                ".join(
+        f"max(value) FILTER (WHERE column_name = '{column}')" for column in COLUMNS
+    )
+    return f"""
+        WITH by_unit (name, unit, column_name) AS (VALUES {by_unit}),
+        by_name (name, column_name) AS (VALUES {by_name}),
+        mapped AS (
+            SELECT fn.variation_id,
+                   coalesce(by_unit.column_name, by_name.column_name) AS column_name,
+                   CASE WHEN trim(fn.value_per_100g) ~ '{NUMERIC_PATTERN}'
+                        THEN replace(trim(fn.value_per_100g), ',', '.')::numeric END AS value
+            FROM food_nutrients fn
+            LEFT JOIN by_unit ON by_unit.name = fn.component AND by_unit.unit = fn.unit_of_measurement
+            LEFT JOIN by_name ON by_name.name = fn.component
+            WHERE fn.variation_id BETWEEN %s AND %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM food_variation_nutrients fvn WHERE fvn.variation_id = fn.variation_id
+              )
+        )
+        INSERT INTO food_variation_nutrients (variation_id, {', '.join(COLUMNS)})
+        SELECT variation_id,
+                {pivot}
+        FROM mapped
+        WHERE column_name IS NOT NULL
+        GROUP BY variation_id
+    """
+
+def migrate_data(chunk_size=10000):
+    """Migrates data from old food_nutrients to new food_variation_nutrients table.
+
+    The pivot runs on the server as one INSERT ... SELECT per range of
+    chunk_size variation ids, each committed on its own, so an interrupted
+    migration keeps its progress and simply continues when run again.
+    """
     
     conn = postgresql_connection()
     cursor = conn.cursor()
     
     try:
-        # Get all food variations
-        cursor.execute("SELECT id FROM food_variations")
-        variation_ids = [row[0] for row in cursor.fetchall()]
-        
-        # Create a mapping of nutrient names to column names
-        nutrient_column_map = {
-            "Energia (kJ)": "energia_kj",
-            "Energia (kcal)": "energia_kcal",
-            "Energia": "energia_kj",  # Handle cases where unit is separate
-            "Umidade": "umidade_g",
-            "Carboidrato total": "carboidrato_total_g",
-            "Carboidrato disponível": "carboidrato_disponivel_g",
-            "Proteína": "proteina_g",
-            "Lipídios": "lipidios_g",
-            "Fibra alimentar": "fibra_alimentar_g",
-            "Álcool": "alcool_g",
-            "Cinzas": "cinzas_g",
-            "Colesterol": "colesterol_mg",
-            "Ácidos graxos saturados": "acidos_graxos_saturados_g",
-            "Ácidos graxos monoinsaturados": "acidos_graxos_monoinsaturados_g",
-            "Ácidos graxos poliinsaturados": "acidos_graxos_poliinsaturados_g",
-            "Ácidos graxos trans": "acidos_graxos_trans_g",
-            "Cálcio": "calcio_mg",
-            "Ferro": "ferro_mg",
-            "Sódio": "sodio_mg",
-            "Magnésio": "magnesio_mg",
-            "Fósforo": "fosforo_mg",
-            "Potássio": "potassio_mg",
-            "Manganês": "manganes_mg",
-            "Zinco": "zinco_mg",
-            "Cobre": "cobre_mg",
-            "Selênio": "selenio_mcg",
-            "Vitamina A (RE)": "vitamina_a_re_mcg",
-            "Vitamina A (RAE)": "vitamina_a_rae_mcg",
-            "Vitamina D": "vitamina_d_mcg",
-            "Alfa-tocoferol (Vitamina E)": "alfa_tocoferol_mg",
-            "Tiamina": "tiamina_mg",
-            "Riboflavina": "riboflavina_mg",
-            "Niacina": "niacina_mg",
-            "Vitamina B6": "vitamina_b6_mg",
-            "Vitamina B12": "vitamina_b12_mcg",
-            "Vitamina C": "vitamina_c_mg",
-            "Equivalente de folato": "equivalente_folato_mcg",
-            "Sal de adição": "sal_de_adicao_g",
-            "Açúcar de adição": "acucar_de_adicao_g"
-        }
+        cursor.execute("SELECT min(variation_id), max(variation_id) FROM food_nutrients")
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            print("No food nutrients to migrate")
+            return
         
+        query = build_migration_query()
+        started = time.perf_counter()
         count = 0
-        for variation_id in variation_ids:
-            # Get all nutrients for this variation
-            cursor.execute(
-                "SELECT component, unit_of_measurement, value_per_100g FROM food_nutrients WHERE variation_id = %s",
-                (variation_id,)
-            )
-            nutrients_data = cursor.fetchall()
-            
-            # Skip if no nutrients
-            if not nutrients_data:
-                continue
-            
-            # Create a dictionary to store nutrient values
-            nutrient_values = {}
-            
-            # Process each nutrient
-            for component, unit, value in nutrients_data:
-                # Create a key for the nutrient (either with unit or without)
-                nutrient_key = f"{component} ({unit})" if unit else component
-                
-                # Find the corresponding column name
-                column_name = nutrient_column_map.get(nutrient_key) or nutrient_column_map.get(component)
-                
-                if column_name:
-                    # Convert value to numeric if possible
-                    try:
-                        numeric_value = float(value.replace(',', '.')) if value and value.strip() != "NA" else None
-                    except (ValueError, AttributeError):
-                        numeric_value = None
-                    
-                    nutrient_values[column_name] = numeric_value
-            
-            # Only proceed if we have values to insert
-            if nutrient_values:
-                # Check if entry already exists
-                cursor.execute(
-                    "SELECT id FROM food_variation_nutrients WHERE variation_id = %s",
-                    (variation_id,)
-                )
-                
-                if cursor.fetchone() is None:
-                    # Build the INSERT query
-                    columns = ['variation_id'] + list(nutrient_values.keys())
-                    placeholders = ['%s'] * len(columns)
-                    values = [variation_id] + list(nutrient_values.values())
-                    
-                    query = f"""
-                        INSERT INTO food_variation_nutrients 
-                        ({', '.join(columns)}) 
-                        VALUES ({', '.join(placeholders)})
-                    """
-                    
-                    cursor.execute(query, values)
-                    count += 1
+        for chunk_start in range(first_id, last_id + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size - 1, last_id)
+            cursor.execute(query, (chunk_start, chunk_end))
+            count += cursor.rowcount
+            conn.commit()
+            print(f"Migrated variations {chunk_start}-{chunk_end} ({count} so far, "
+                  f"{time.perf_counter() - started:.1f}s)...")
         
-        conn.commit()
         print(f"Successfully migrated {count} food variations to the new structure")
+        elapsed = refresh_read_model(conn)
+        if elapsed is not None:
+            print(f"Refreshed {READ_MODEL} in {elapsed:.1f}s")
     except Exception as e:
         conn.rollback()
         print(f"Error migrating data: {e}")
@@ -195,6 +139,8 @@ def migrate_data():
 
 if __name__ == "__main__":
     print("Starting database migration...")
+    # Bring databases created by an older create_database.sql up to date
+    upgrade_schema()
     # First populate the nutrients reference table
     populate_nutrients_table()
     # Then migrate the data
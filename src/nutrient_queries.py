@@ -0,0 +1,155 @@
+import numpy as np
+
+from columnar_export import load_table, table_from_db
+
+
+class NutrientQueries:
+    """In-process versions of the queries in example_queries.sql over a NutrientTable.
+
+    The table is copied into memory once. Every column gets a sort index
+    (NaN last) so range predicates are answered with a binary search, and
+    groups are encoded as integers. Each method returns rows shaped like
+    the SQL version, as tuples; NULL comparisons behave like NaN ones, so
+    a missing value never matches a filter and comes back as None. Ties
+    are broken by food code, names sort by code point (like COLLATE "C")
+    and queries without ORDER BY in SQL return rows in code order.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.values = np.array(table.values, dtype=np.float64)
+        self.names = np.array(table.names, dtype=object)
+        self.groups = np.array(table.groups, dtype=object)
+        group_names, self.group_codes = np.unique(self.groups.astype(str), return_inverse=True)
+        self.group_ids = {name: index for index, name in enumerate(group_names)}
+
+        # argsort puts NaN last, so the first `valid` positions hold every known value in order
+        self.sort_index = np.argsort(self.values, axis=0, kind='stable')
+        self.sorted_values = np.take_along_axis(self.values, self.sort_index, axis=0)
+        self.valid_counts = np.count_nonzero(~np.isnan(self.values), axis=0)
+
+    def column(self, name):
+        return self.values[:, self.table.column_index[name]]
+
+    def range_rows(self, name, low=None, high=None, include_low=False, include_high=False):
+        """Returns the rows (in code order) with low < value < high; inclusive bounds are opt-in"""
+        index = self.table.column_index[name]
+        column = self.sorted_values[:self.valid_counts[index], index]
+        start = 0 if low is None else np.searchsorted(column, low, side='left' if include_low else 'right')
+        end = len(column) if high is None else np.searchsorted(column, high, side='right' if include_high else 'left')
+        return np.sort(self.sort_index[start:end, index])
+
+    def order_rows(self, rows, keys, descending=False, limit=None):
+        """Sorts rows by their keys, breaking ties by code, optionally keeping only the first `limit`"""
+        keys = np.asarray(keys)
+        if limit is not None and limit < len(rows):
+            # Keep every row tied with the limit-th key so ties are still resolved by code
+            kth = len(rows) - limit if descending else limit - 1
+            threshold = np.partition(keys, kth)[kth]
+            candidates = keys >= threshold if descending else keys <= threshold
+            rows, keys = rows[candidates], keys[candidates]
+        order = np.lexsort((rows, -keys if descending else keys))
+        return rows[order[:limit]]
+
+    def _rows(self, rows, *fields):
+        columns = []
+        for field in fields:
+            if not isinstance(field, str):
+                # Values computed by the query itself
+                columns.append(field.tolist())
+            elif field == 'name':
+                columns.append(self.names[rows].tolist())
+            elif field == 'group':
+                columns.append(self.groups[rows].tolist())
+            else:
+                # Missing values come back as None, like NULL from the database
+                columns.append([None if value != value else value for value in self.column(field)[rows].tolist()])
+        return list(zip(*columns))
+
+    def food(self, code):
+        """1. Basic information and every nutrient of a food, as a dict (None when not found)"""
+        row = self.table.row_index.get(code)
+        if row is None:
+            return None
+        food = {'code': code, 'name': self.table.names[row], 'group': self.table.groups[row],
+                'description': self.table.descriptions[row]}
+        food.update((column, None if np.isnan(value) else float(value))
+                    for column, value in zip(self.table.columns, self.values[row]))
+        return food
+
+    def top(self, column, limit=10):
+        """2. (name, group, value) of the foods with the highest value of a nutrient, e.g. proteina_g"""
+        values = self.column(column)
+        rows = np.flatnonzero(~np.isnan(values))
+        rows = self.order_rows(rows, values[rows], descending=True, limit=limit)
+        return self._rows(rows, 'name', 'group', column)
+
+    def high_vitamin_c_low_fat(self, min_vitamin_c=50, max_fat=3):
+        """3. (name, group, vitamina_c_mg, lipidios_g) with vitamin C > min_vitamin_c and fat < max_fat"""
+        rows = self.range_rows('vitamina_c_mg', low=min_vitamin_c)
+        rows = rows[self.column('lipidios_g')[rows] < max_fat]
+        rows = self.order_rows(rows, self.column('vitamina_c_mg')[rows], descending=True)
+        return self._rows(rows, 'name', 'group', 'vitamina_c_mg', 'lipidios_g')
+
+    def energy_distribution(self, limit=20):
+        """4. (name, group, kcal, protein, carbs, fat, protein %, carb %, fat %) of foods with energy > 0"""
+        kcal = self.column('energia_kcal')
+        protein = self.column('proteina_g')
+        carbs = self.column('carboidrato_total_g')
+        fat = self.column('lipidios_g')
+        mask = (kcal > 0) & ~np.isnan(protein) & ~np.isnan(carbs) & ~np.isnan(fat)
+        rows = np.flatnonzero(mask)[:limit]
+        return self._rows(rows, 'name', 'group', 'energia_kcal', 'proteina_g', 'carboidrato_total_g', 'lipidios_g',
+                          np.round(protein[rows] * 4 * 100 / kcal[rows], 1),
+                          np.round(carbs[rows] * 4 * 100 / kcal[rows], 1),
+                          np.round(fat[rows] * 9 * 100 / kcal[rows], 1))
+
+    def rich_in_minerals(self, min_calcium=100, min_iron=1.8):
+        """5. (name, group, calcio_mg, ferro_mg) above both limits, by calcium + 50 x iron"""
+        rows = self.range_rows('calcio_mg', low=min_calcium)
+        iron = self.column('ferro_mg')
+        rows = rows[iron[rows] > min_iron]
+        rows = self.order_rows(rows, self.column('calcio_mg')[rows] + iron[rows] * 50, descending=True)
+        return self._rows(rows, 'name', 'group', 'calcio_mg', 'ferro_mg')
+
+    def low_sodium(self, max_sodium=140):
+        """6. (name, group, sodio_mg) with 0 <= sodium < max_sodium, lowest first"""
+        rows = self.range_rows('sodio_mg', low=0, high=max_sodium, include_low=True)
+        rows = self.order_rows(rows, self.column('sodio_mg')[rows])
+        return self._rows(rows, 'name', 'group', 'sodio_mg')
+
+    def group_comparison(self, group='Frutas e derivados'):
+        """7. (name, carbs, fiber, vitamin C) of a group's foods with carbs and fiber, by name"""
+        group_id = self.group_ids.get(group)
+        if group_id is None:
+            return []
+        rows = np.flatnonzero((self.group_codes == group_id)
+                              & ~np.isnan(self.column('carboidrato_total_g'))
+                              & ~np.isnan(self.column('fibra_alimentar_g')))
+        rows = rows[np.lexsort((rows, self.names[rows].astype(str)))]
+        return self._rows(rows, 'name', 'carboidrato_total_g', 'fibra_alimentar_g', 'vitamina_c_mg')
+
+    def nutrient_density_scores(self):
+        """Nutrient density per 100 kcal of every row, NaN where energy is missing or not positive"""
+        def known(column, scale=1):
+            return np.nan_to_num(self.column(column) / scale, nan=0.0)
+
+        kcal = self.column('energia_kcal')
+        score = (known('proteina_g') + known('fibra_alimentar_g') * 2 + known('vitamina_c_mg', 60)
+                 + known('ferro_mg', 8) + known('calcio_mg', 800) + known('vitamina_a_re_mcg', 800))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(kcal > 0, score / (kcal / 100), np.nan)
+
+    def nutrient_density(self, limit=20):
+        """8. (name, group, kcal, score) of the foods with the highest nutrient density score"""
+        scores = self.nutrient_density_scores()
+        rows = np.flatnonzero(~np.isnan(scores))
+        rows = self.order_rows(rows, scores[rows], descending=True, limit=limit)
+        return self._rows(rows, 'name', 'group', 'energia_kcal', scores[rows])
+
+
+def load_queries(conn=None, directory=None):
+    """Builds the query engine from the database, or from a columnar export when no connection is given"""
+    if conn is not None:
+        return NutrientQueries(table_from_db(conn))
+    return NutrientQueries(load_table(directory) if directory else load_table())
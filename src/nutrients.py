@@ -0,0 +1,120 @@
+"""Nutrient normalization shared by the scraper, the bulk loader and the migration.
+
+It has no dependencies, so the export and query modules can use it
+without importing the scraper. Everything here is built once at import:
+the fixed column order of food_variation_nutrients, the (component, unit)
+lookup table and the INSERT statement for the column-based table.
+"""
+
+# Nutrients with their units, categories and food_variation_nutrients columns, in column order
+NUTRIENTS = [
+    {"name": "Energia", "unit": "kJ", "category": "Energy", "column": "energia_kj"},
+    {"name": "Energia", "unit": "kcal", "category": "Energy", "column": "energia_kcal"},
+    {"name": "Umidade", "unit": "g", "category": "Basic", "column": "umidade_g"},
+    {"name": "Carboidrato total", "unit": "g", "category": "Macronutrient", "column": "carboidrato_total_g"},
+    {"name": "Carboidrato disponível", "unit": "g", "category": "Macronutrient", "column": "carboidrato_disponivel_g"},
+    {"name": "Proteína", "unit": "g", "category": "Macronutrient", "column": "proteina_g"},
+    {"name": "Lipídios", "unit": "g", "category": "Macronutrient", "column": "lipidios_g"},
+    {"name": "Fibra alimentar", "unit": "g", "category": "Macronutrient", "column": "fibra_alimentar_g"},
+    {"name": "Álcool", "unit": "g", "category": "Other", "column": "alcool_g"},
+    {"name": "Cinzas", "unit": "g", "category": "Other", "column": "cinzas_g"},
+    {"name": "Colesterol", "unit": "mg", "category": "Lipid", "column": "colesterol_mg"},
+    {"name": "Ácidos graxos saturados", "unit": "g", "category": "Lipid", "column": "acidos_graxos_saturados_g"},
+    {"name": "Ácidos graxos monoinsaturados", "unit": "g", "category": "Lipid", "column": "acidos_graxos_monoinsaturados_g"},
+    {"name": "Ácidos graxos poliinsaturados", "unit": "g", "category": "Lipid", "column": "acidos_graxos_poliinsaturados_g"},
+    {"name": "Ácidos graxos trans", "unit": "g", "category": "Lipid", "column": "acidos_graxos_trans_g"},
+    {"name": "Cálcio", "unit": "mg", "category": "Mineral", "column": "calcio_mg"},
+    {"name": "Ferro", "unit": "mg", "category": "Mineral", "column": "ferro_mg"},
+    {"name": "Sódio", "unit": "mg", "category": "Mineral", "column": "sodio_mg"},
+    {"name": "Magnésio", "unit": "mg", "category": "Mineral", "column": "magnesio_mg"},
+    {"name": "Fósforo", "unit": "mg", "category": "Mineral", "column": "fosforo_mg"},
+    {"name": "Potássio", "unit": "mg", "category": "Mineral", "column": "potassio_mg"},
+    {"name": "Manganês", "unit": "mg", "category": "Mineral", "column": "manganes_mg"},
+    {"name": "Zinco", "unit": "mg", "category": "Mineral", "column": "zinco_mg"},
+    {"name": "Cobre", "unit": "mg", "category": "Mineral", "column": "cobre_mg"},
+    {"name": "Selênio", "unit": "mcg", "category": "Mineral", "column": "selenio_mcg"},
+    {"name": "Vitamina A (RE)", "unit": "mcg", "category": "Vitamin", "column": "vitamina_a_re_mcg"},
+    {"name": "Vitamina A (RAE)", "unit": "mcg", "category": "Vitamin", "column": "vitamina_a_rae_mcg"},
+    {"name": "Vitamina D", "unit": "mcg", "category": "Vitamin", "column": "vitamina_d_mcg"},
+    {"name": "Alfa-tocoferol (Vitamina E)", "unit": "mg", "category": "Vitamin", "column": "alfa_tocoferol_mg"},
+    {"name": "Tiamina", "unit": "mg", "category": "Vitamin", "column": "tiamina_mg"},
+    {"name": "Riboflavina", "unit": "mg", "category": "Vitamin", "column": "riboflavina_mg"},
+    {"name": "Niacina", "unit": "mg", "category": "Vitamin", "column": "niacina_mg"},
+    {"name": "Vitamina B6", "unit": "mg", "category": "Vitamin", "column": "vitamina_b6_mg"},
+    {"name": "Vitamina B12", "unit": "mcg", "category": "Vitamin", "column": "vitamina_b12_mcg"},
+    {"name": "Vitamina C", "unit": "mg", "category": "Vitamin", "column": "vitamina_c_mg"},
+    {"name": "Equivalente de folato", "unit": "mcg", "category": "Vitamin", "column": "equivalente_folato_mcg"},
+    {"name": "Sal de adição", "unit": "g", "category": "Other", "column": "sal_de_adicao_g"},
+    {"name": "Açúcar de adição", "unit": "g", "category": "Other", "column": "acucar_de_adicao_g"}
+]
+
+COLUMNS = [nutrient["column"] for nutrient in NUTRIENTS]
+
+# (component, unit) -> column index
+UNIT_INDEX = {(nutrient["name"], nutrient["unit"]): index for index, nutrient in enumerate(NUTRIENTS)}
+
+# Components whose unit is missing or unexpected, matched by name alone or by "name (unit)".
+# A name with several units (Energia) falls back to its first entry.
+NAME_INDEX = {}
+for index, nutrient in enumerate(NUTRIENTS):
+    NAME_INDEX.setdefault(nutrient["name"], index)
+    NAME_INDEX[f"{nutrient['name']} ({nutrient['unit']})"] = index
+
+INSERT_VARIATION_NUTRIENTS = (
+    f"INSERT INTO food_variation_nutrients (variation_id, {', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})"
+)
+
+# Memoized lookups of every (component, unit) pair seen so far
+_column_indexes = dict(UNIT_INDEX)
+
+
+def column_index(component, unit):
+    """Returns the column index of a nutrient, or None when it has no column"""
+    try:
+        return _column_indexes[(component, unit)]
+    except KeyError:
+        index = _column_indexes[(component, unit)] = NAME_INDEX.get(component)
+        return index
+
+
+def parse_value(value):
+    """Parses a value with a decimal comma, returning None for "NA", blanks and anything non-numeric"""
+    if not value or value == "NA":
+        return None
+    try:
+        return float(value.replace(',', '.'))
+    except (ValueError, AttributeError):
+        return None
+
+
+def process_description(description):
+    """Splits a food description into its main part (the name) and the observations line"""
+    parts = description.split(",")
+    main_part = parts[0].strip()
+    observations = [part.strip().replace("s/", "without").replace("c/", "with") for part in parts[1:]]
+    observations_line = ", ".join(observations) if observations else main_part
+    return main_part, observations_line
+
+
+def normalize(nutrients):
+    """Normalizes the scraped nutrient list of a food in a single pass.
+
+    Returns the legacy (component, unit, value) rows, truncated to the
+    food_nutrients column sizes, and the numeric values in COLUMNS order
+    with None for missing nutrients.
+    """
+    legacy_rows = []
+    values = [None] * len(COLUMNS)
+    for nutrient in nutrients:
+        component = nutrient.get('Component', '')[:499]
+        unit = nutrient.get('Units', '')[:99]
+        value = nutrient.get('Value per 100g', '')[:99]
+        legacy_rows.append((component, unit, value))
+        index = _column_indexes.get((component, unit))
+        if index is None:
+            index = column_index(component, unit)
+            if index is None:
+                continue
+        values[index] = parse_value(value)
+    return legacy_rows, values
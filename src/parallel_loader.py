@@ -0,0 +1,179 @@
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bulk_loader import BulkLoader, prepare_food
+from dbconnect import postgresql_connection
+from snapshot import Snapshot, codec_for, decompress, is_snapshot
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+_processor = None
+
+
+def split_ranges(path, chunk_bytes):
+    """Splits a JSONL file into (start, end) byte ranges that begin and end on line boundaries.
+
+    A snapshot is split on frame boundaries instead, using its index.
+    """
+    if is_snapshot(path):
+        with Snapshot(path) as snapshot:
+            frames = snapshot.frames
+        ranges = []
+        for offset, length, _ in frames:
+            if ranges and offset + length - ranges[-1][0] <= chunk_bytes:
+                ranges[-1] = (ranges[-1][0], offset + length)
+            else:
+                ranges.append((offset, offset + length))
+        return ranges
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as file:
+        start = 0
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _init_worker(processor):
+    global _processor
+    _processor = processor
+
+
+def parse_range(path, start, end):
+    """Parses and normalizes the foods in one byte range; runs in a worker process.
+
+    Returns (records, errors, seconds spent).
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    if is_snapshot(path):
+        # Stale copies of a code are loaded too; the later copy wins in the writer, as in a JSONL dump
+        data = decompress(data, codec_for(path))
+    records = []
+    errors = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(prepare_food(_processor, json_loads(line)))
+        except Exception as e:
+            errors.append(str(e))
+    return records, errors, time.perf_counter() - started
+
+
+def _writer(conn, processor, batch_size, records_queue, stats, metrics=None):
+    loader = BulkLoader(conn, processor, batch_size, metrics=metrics)
+    failed = 0
+    while True:
+        records = records_queue.get()
+        if records is None:
+            break
+        try:
+            for record in records:
+                loader.add_prepared(record)
+        except Exception as e:
+            # Keep draining the queue so the parser never blocks on a dead writer
+            failed += len(records)
+            print(f"Error writing batch: {e}")
+    try:
+        loader.flush()
+    except Exception as e:
+        failed += len(loader.pending)
+        print(f"Error writing batch: {e}")
+    stats.append((loader.saved_count, loader.failed_count + failed))
+
+
+def load_file_parallel(processor, path, batch_size=500, workers=None, writers=2,
+                       chunk_bytes=4 * 1024 * 1024, report_every=5.0, metrics=None):
+    """Loads a JSONL dump into the database with parallel parsing and writing.
+
+    The file is split into byte ranges that `workers` processes parse and
+    normalize (with orjson when it is installed). The normalized records
+    are routed by food code to `writers` threads, each holding its own
+    connection and BulkLoader, so every code is always written by the same
+    connection in file order and the last copy of a code wins, as in the
+    serial loader. Queues are bounded, so the file is streamed rather than
+    loaded into memory. With a metrics.Metrics the parsing of each range
+    is timed as the normalize_range stage and the writers time their
+    db_write and commit stages. Returns (saved, failed, lines with errors).
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(path, chunk_bytes)
+    queues = [queue.Queue(maxsize=4) for _ in range(writers)]
+    stats = []
+    connections = [postgresql_connection() for _ in range(writers)]
+    threads = [
+        threading.Thread(target=_writer, args=(conn, processor, batch_size, records_queue, stats, metrics))
+        for conn, records_queue in zip(connections, queues)
+    ]
+    for thread in threads:
+        thread.start()
+
+    started = last_report = time.perf_counter()
+    parsed_count = 0
+    error_count = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(processor,)) as executor:
+            # Keep a bounded window of ranges in flight and consume them in file order
+            in_flight = deque()
+            pending_ranges = iter(ranges)
+            for start, end in pending_ranges:
+                in_flight.append(executor.submit(parse_range, path, start, end))
+                if len(in_flight) >= workers * 2:
+                    break
+            while in_flight:
+                records, errors, seconds = in_flight.popleft().result()
+                next_range = next(pending_ranges, None)
+                if next_range:
+                    in_flight.append(executor.submit(parse_range, path, *next_range))
+
+                for error in errors:
+                    print(f"Error processing line: {error}")
+                error_count += len(errors)
+                parsed_count += len(records)
+                if metrics is not None:
+                    metrics.observe('normalize_range', seconds)
+                    metrics.increment('foods_processed', len(records) + len(errors))
+
+                routed = [[] for _ in range(writers)]
+                for record in records:
+                    routed[zlib.crc32(record[0].encode('utf-8')) % writers].append(record)
+                for records_queue, chunk in zip(queues, routed):
+                    if chunk:
+                        records_queue.put(chunk)
+
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    last_report = now
+                    print(f"Parsed {parsed_count} foods ({parsed_count / (now - started):.0f} foods/s)...")
+    finally:
+        for records_queue in queues:
+            records_queue.put(None)
+        for thread in threads:
+            thread.join()
+        for conn in connections:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    saved = sum(saved for saved, _ in stats)
+    failed = sum(failed for _, failed in stats)
+    print(f"Loaded {saved} foods in {elapsed:.1f}s ({saved / elapsed if elapsed else 0:.0f} foods/s) "
+          f"with {workers} parser processes and {writers} writer connections.")
+    return saved, failed, error_count
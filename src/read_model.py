@@ -0,0 +1,82 @@
+"""Denormalized read model of the nutrient tables.
+
+food_profiles is a materialized view with one wide row per food
+variation: the food's code, name and group, the variation description and
+every nutrient column. The example queries read it without joins. It is
+refreshed after every scrape, load and migration. The refresh runs
+CONCURRENTLY once the view has data, so readers are never blocked.
+This is the only definition of the view: the first refresh creates it.
+"""
+import time
+
+from dbconnect import postgresql_connection
+from nutrients import COLUMNS
+
+READ_MODEL = "food_profiles"
+
+CREATE_READ_MODEL = f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {READ_MODEL} AS
+    SELECT fv.id AS variation_id, f.id AS food_id, f.code, f.name, f."group", fv.description,
+        {', '.join(f'fvn.{column}' for column in COLUMNS)}
+    FROM foods f
+    JOIN food_variations fv ON fv.food_id = f.id
+    JOIN food_variation_nutrients fvn ON fvn.variation_id = fv.id
+    ORDER BY f."group", f.code
+"""
+
+# Nutrients the example queries filter or sort on
+INDEXED_NUTRIENTS = ['proteina_g', 'vitamina_c_mg', 'calcio_mg', 'sodio_mg', 'energia_kcal']
+
+READ_MODEL_INDEXES = [
+    # Required by REFRESH ... CONCURRENTLY
+    f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{READ_MODEL}_variation_id ON {READ_MODEL} (variation_id)",
+    f"CREATE INDEX IF NOT EXISTS idx_{READ_MODEL}_code ON {READ_MODEL} (code)",
+    f'CREATE INDEX IF NOT EXISTS idx_{READ_MODEL}_group_name ON {READ_MODEL} ("group", name)',
+] + [
+    f"CREATE INDEX IF NOT EXISTS idx_{READ_MODEL}_{column} ON {READ_MODEL} ({column}) WHERE {column} IS NOT NULL"
+    for column in INDEXED_NUTRIENTS
+]
+
+
+def create_read_model(cursor):
+    """Creates the materialized view (filled with the current data) and its indexes"""
+    cursor.execute(CREATE_READ_MODEL)
+    for statement in READ_MODEL_INDEXES:
+        cursor.execute(statement)
+
+
+def refresh_read_model(conn, concurrently=True):
+    """Brings food_profiles up to date, creating it when it does not exist yet.
+
+    The concurrent refresh only writes the rows that changed and keeps
+    the view readable meanwhile. A plain refresh locks the view and
+    rewrites it in ("group", code) order. Returns the seconds spent, or
+    None when the refresh failed.
+    """
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = %s "
+                           "AND schemaname = ANY(current_schemas(false))", (READ_MODEL,))
+            row = cursor.fetchone()
+            if row is None:
+                create_read_model(cursor)
+            else:
+                # A view that was never populated can only be refreshed the plain way
+                mode = " CONCURRENTLY" if concurrently and row[0] else ""
+                cursor.execute(f"REFRESH MATERIALIZED VIEW{mode} {READ_MODEL}")
+            cursor.execute(f"ANALYZE {READ_MODEL}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error refreshing {READ_MODEL}: {e}")
+        return None
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    conn = postgresql_connection()
+    elapsed = refresh_read_model(conn)
+    if elapsed is not None:
+        print(f"Refreshed {READ_MODEL} in {elapsed:.1f}s")
+    conn.close()
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from nutrients import COLUMNS
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+
+class FoodVectorCache:
+    """LRU cache of per-100 g nutrient vectors, stored as the rows of one dense matrix.
+
+    `fetch(codes)` returns {code: vector} for the codes it knows and is
+    called once per batch of misses. Missing nutrient values are stored as
+    0, so they add nothing to totals. The cache grows past `capacity` only
+    when a single batch needs more distinct foods than that.
+    """
+
+    def __init__(self, fetch, columns=COLUMNS, capacity=8192):
+        self.fetch = fetch
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.matrix = np.zeros((capacity, len(self.columns)))
+        self.slots = OrderedDict()
+        self.free = list(range(capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, codes):
+        """Returns {code: matrix row} for the given distinct codes, fetching the missing ones"""
+        resolved = {}
+        missing = []
+        for code in codes:
+            slot = self.slots.get(code)
+            if slot is None:
+                missing.append(code)
+            else:
+                self.slots.move_to_end(code)
+                resolved[code] = slot
+        self.hits += len(resolved)
+        self.misses += len(missing)
+        if not missing:
+            return resolved
+
+        vectors = self.fetch(missing)
+        if len(resolved) + len(vectors) > self.capacity:
+            # One batch needs more foods than fit: grow instead of evicting rows in use
+            grown = len(resolved) + len(vectors)
+            self.matrix = np.vstack([self.matrix, np.zeros((grown - self.capacity, len(self.columns)))])
+            self.free.extend(range(self.capacity, grown))
+            self.capacity = grown
+        for code, vector in vectors.items():
+            if not self.free:
+                # Evict the least recently used food; rows of this batch were moved to the end
+                _, slot = self.slots.popitem(last=False)
+                self.free.append(slot)
+            slot = self.free.pop()
+            self.matrix[slot] = np.nan_to_num(np.asarray(vector, dtype=np.float64))
+            self.slots[code] = slot
+            resolved[code] = slot
+        return resolved
+
+
+class RecipeCalculator:
+    """Nutrient totals of recipes, each a list of (food code, grams).
+
+    A batch of recipes becomes one sparse matrix of grams / 100 (recipes x
+    foods) multiplied by the dense per-100 g matrix of the cached foods,
+    using scipy.sparse when it is installed and a segmented NumPy sum
+    otherwise.
+    """
+
+    def __init__(self, fetch, columns=COLUMNS, cache_size=8192):
+        self.columns = list(columns)
+        self.cache = FoodVectorCache(fetch, self.columns, cache_size)
+
+    @classmethod
+    def from_table(cls, table, cache_size=8192):
+        """Calculator over a columnar_export.NutrientTable"""
+        def fetch(codes):
+            return {code: table.values[table.row_index[code]] for code in codes if code in table.row_index}
+        return cls(fetch, table.columns, cache_size)
+
+    @classmethod
+    def from_db(cls, conn, cache_size=8192):
+        """Calculator that loads food vectors from food_variation_nutrients on demand"""
+        def fetch(codes):
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT DISTINCT ON (f.code) f.code, {', '.join(f'fvn.{column}' for column in COLUMNS)}
+                    FROM foods f
+                    JOIN food_variations fv ON f.id = fv.food_id
+                    JOIN food_variation_nutrients fvn ON fv.id = fvn.variation_id
+                    WHERE f.code = ANY(%s)
+                    ORDER BY f.code, fv.id
+                """, (list(codes),))
+                rows = cursor.fetchall()
+            conn.commit()
+            return {row[0]: np.array(row[1:], dtype=np.float64) for row in rows}
+        return cls(fetch, COLUMNS, cache_size)
+
+    def totals(self, recipes, strict=True):
+        """Returns a (len(recipes), len(columns)) matrix of nutrient totals.
+
+        With strict=True an unknown food code raises KeyError, otherwise it
+        is left out of its recipe.
+        """
+        lengths = np.fromiter((len(recipe) for recipe in recipes), dtype=np.int64, count=len(recipes))
+        codes = [code for recipe in recipes for code, _ in recipe]
+        weights = np.fromiter((grams for recipe in recipes for _, grams in recipe), dtype=np.float64,
+                              count=len(codes)) / 100.0
+        distinct = dict.fromkeys(codes)
+        slots = self.cache.resolve(distinct)
+        if len(slots) < len(distinct):
+            unknown = sorted(distinct.keys() - slots.keys())
+            if strict:
+                raise KeyError(f"Unknown food codes: {', '.join(unknown[:10])}")
+            # Unknown foods weigh nothing
+            weights[[index for index, code in enumerate(codes) if code not in slots]] = 0.0
+        columns = np.fromiter((slots.get(code, 0) for code in codes), dtype=np.int64, count=len(codes))
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+
+        if sparse is not None:
+            amounts = sparse.csr_matrix((weights, columns, indptr), shape=(len(recipes), len(self.cache.matrix)))
+            return np.asarray(amounts @ self.cache.matrix)
+        totals = np.zeros((len(recipes), len(self.columns)))
+        filled = lengths > 0
+        if filled.any():
+            weighted = self.cache.matrix[columns] * weights[:, None]
+            totals[filled] = np.add.reduceat(weighted, indptr[:-1][filled], axis=0)
+        return totals
+
+    def total(self, recipe, strict=True):
+        """Returns {column: total} of a single recipe"""
+        return dict(zip(self.columns, self.totals([recipe], strict)[0].tolist()))
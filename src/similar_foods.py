@@ -0,0 +1,184 @@
+import numpy as np
+
+
+class SimilarFoods:
+    """Nearest-neighbour index of foods over their standardized nutrient profiles.
+
+    Every nutrient is scaled to zero mean and unit variance over the
+    table, and missing values are placed at the mean, so they neither
+    attract nor repel. Distances are Euclidean in that space.
+
+    The exact search scans the matrix in blocks of `block_size` rows with
+    one matrix product per block, so any number of queries is answered in
+    a single pass. The approximate search is an inverted file: foods are
+    clustered into `cells` k-means cells (about sqrt(foods) by default) and
+    a query only scans the foods of its `probes` nearest cells.
+    """
+
+    def __init__(self, table, columns=None, block_size=8192, cells=None, seed=0):
+        self.columns = list(columns or table.columns)
+        self.codes = np.array(table.codes)
+        self.names = np.array(table.names)
+        self.groups = np.array(table.groups)
+        self.block_size = block_size
+
+        values = np.array([table.column(column) for column in self.columns], dtype=np.float64).T
+        values = values.reshape(len(self.codes), len(self.columns))
+        known = ~np.isnan(values)
+        counts = np.maximum(known.sum(axis=0), 1)
+        self.mean = np.nansum(values, axis=0) / counts
+        self.scale = np.sqrt(np.where(known, (values - self.mean) ** 2, 0).sum(axis=0) / counts)
+        self.scale[self.scale == 0] = 1.0
+        self.vectors = self.standardize(values)
+
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.centroids, self.assignment = self.cluster(cells or max(1, int(np.sqrt(len(self.codes)))), seed)
+        self._prepare()
+
+    def cluster(self, cells, seed=0, iterations=10):
+        """Runs k-means over the vectors, returning (centroids, cell of every food)"""
+        rng = np.random.default_rng(seed)
+        cells = min(cells, len(self.vectors)) or 1
+        centroids = self.vectors[rng.choice(len(self.vectors), cells, replace=False)] if len(self.vectors) \
+            else np.zeros((1, len(self.columns)), dtype=np.float32)
+        assignment = np.zeros(len(self.vectors), dtype=np.int64)
+        for _ in range(iterations):
+            distances = self.norms[:, None] - 2 * (self.vectors @ centroids.T) + np.einsum('ij,ij->i', centroids, centroids)
+            assignment = np.argmin(distances, axis=1)
+            counts = np.bincount(assignment, minlength=cells)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.vectors)
+            # Empty cells keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids, assignment
+
+    def _prepare(self):
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.cell_rows = np.argsort(self.assignment, kind='stable')
+        self.cell_offsets = np.searchsorted(self.assignment[self.cell_rows], np.arange(len(self.centroids) + 1))
+        self.row_index = {code: row for row, code in enumerate(self.codes.tolist())}
+        self.labels = list(zip(self.codes.tolist(), self.names.tolist(), self.groups.tolist()))
+        self.group_rows = {group: np.flatnonzero(self.groups == group) for group in np.unique(self.groups).tolist()}
+
+    def standardize(self, values):
+        """Scales raw nutrient values (NaN for missing) into the index space"""
+        return np.nan_to_num((np.asarray(values, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+
+    def _top_k(self, queries, query_norms, vectors, norms, k, exclude=None):
+        """Returns the (distances, positions) of the k nearest vectors of every query, nearest first"""
+        count = len(queries)
+        best_distances = np.full((count, k), np.inf, dtype=np.float32)
+        best_positions = np.full((count, k), -1, dtype=np.int64)
+        for start in range(0, len(vectors), self.block_size):
+            block = vectors[start:start + self.block_size]
+            distances = query_norms[:, None] + norms[None, start:start + len(block)] - 2 * (queries @ block.T)
+            if exclude is not None:
+                # Drop the query food itself from its own results
+                inside = (exclude >= start) & (exclude < start + len(block))
+                distances[inside, exclude[inside] - start] = np.inf
+            positions = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+            distances = np.concatenate([best_distances, distances], axis=1)
+            positions = np.concatenate([best_positions, positions], axis=1)
+            keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            best_distances = np.take_along_axis(distances, keep, axis=1)
+            best_positions = np.take_along_axis(positions, keep, axis=1)
+        order = np.argsort(best_distances, axis=1, kind='stable')
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_positions = np.take_along_axis(best_positions, order, axis=1)
+        return np.sqrt(np.maximum(best_distances, 0)), best_positions
+
+    def search(self, vectors, k=10, group=None, approximate=False, probes=8, exclude_rows=None):
+        """Finds the k nearest foods of each standardized vector.
+
+        Returns (distances, rows), both of shape (len(vectors), k); rows are
+        -1 where fewer than k foods are available. `group` restricts the
+        results to one foods.group and `exclude_rows` gives the row of each
+        query to leave out of its own results (or -1).
+        """
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if exclude_rows is None:
+            exclude_rows = np.full(len(queries), -1)
+        exclude_rows = np.asarray(exclude_rows, dtype=np.int64)
+        # A group is already a small slice of the table, so it is always searched exactly
+        if approximate and group is None and probes < len(self.centroids):
+            return self._search_cells(queries, k, probes, exclude_rows)
+
+        rows = self.group_rows.get(group, np.empty(0, dtype=np.int64)) if group is not None else None
+        exclude = exclude_rows
+        if rows is not None:
+            # Translate table rows into positions within the group
+            group_positions = np.full(len(self.codes) + 1, -1)
+            group_positions[rows] = np.arange(len(rows))
+            exclude = group_positions[exclude_rows]
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        distances, positions = self._top_k(queries, np.einsum('ij,ij->i', queries, queries), vectors, norms, k, exclude)
+
+        missing = ~np.isfinite(distances) | (positions < 0)
+        if rows is not None and len(rows):
+            positions = rows[np.maximum(positions, 0)]
+        return np.where(missing, np.inf, distances), np.where(missing, -1, positions)
+
+    def _search_cells(self, queries, k, probes, exclude_rows):
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+        cell_distances = query_norms[:, None] + self.centroid_norms[None, :] - 2 * (queries @ self.centroids.T)
+        nearest_cells = np.argpartition(cell_distances, probes - 1, axis=1)[:, :probes]
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        neighbours = np.full((len(queries), k), -1, dtype=np.int64)
+        for index, cells in enumerate(nearest_cells):
+            candidates = np.concatenate([self.cell_rows[self.cell_offsets[cell]:self.cell_offsets[cell + 1]]
+                                         for cell in cells])
+            candidates = candidates[candidates != exclude_rows[index]]
+            if len(candidates) < k:
+                # Too few foods near the query: fall back to the exact search
+                exact_distances, exact_rows = self.search(queries[index:index + 1], k,
+                                                          exclude_rows=exclude_rows[index:index + 1])
+                distances[index], neighbours[index] = exact_distances[0], exact_rows[0]
+                continue
+            candidate_distances = self.norms[candidates] + query_norms[index] - 2 * (self.vectors[candidates] @ queries[index])
+            best = np.argpartition(candidate_distances, k - 1)[:k]
+            best = best[np.lexsort((candidates[best], candidate_distances[best]))]
+            distances[index] = np.sqrt(np.maximum(candidate_distances[best], 0))
+            neighbours[index] = candidates[best]
+        return distances, neighbours
+
+    def similar(self, code, k=10, group=None, approximate=False):
+        """Returns (code, name, group, distance) of the k foods nutritionally closest to a food code"""
+        return self.similar_many([code], k, group, approximate)[0]
+
+    def similar_many(self, codes, k=10, group=None, approximate=False):
+        """Like similar() for many food codes at once, in a single blocked pass"""
+        rows = np.array([self.row_index[code] for code in codes], dtype=np.int64)
+        distances, neighbours = self.search(self.vectors[rows], k, group, approximate, exclude_rows=rows)
+        return [
+            [self.labels[row] + (distance,)
+             for row, distance in zip(row_neighbours, row_distances) if row >= 0]
+            for row_neighbours, row_distances in zip(neighbours.tolist(), distances.tolist())
+        ]
+
+    def save(self, path):
+        """Saves the index to a .npz file"""
+        np.savez(path, columns=np.array(self.columns), codes=self.codes, names=self.names, groups=self.groups,
+                 mean=self.mean, scale=self.scale, vectors=self.vectors, centroids=self.centroids,
+                 assignment=self.assignment, block_size=self.block_size)
+
+
+def load_similar_foods(path):
+    """Loads an index saved with SimilarFoods.save"""
+    with np.load(path, allow_pickle=False) as data:
+        index = SimilarFoods.__new__(SimilarFoods)
+        index.columns = data['columns'].tolist()
+        index.codes = data['codes']
+        index.names = data['names']
+        index.groups = data['groups']
+        index.mean = data['mean']
+        index.scale = data['scale']
+        index.vectors = data['vectors']
+        index.centroids = data['centroids']
+        index.assignment = data['assignment']
+        index.block_size = int(data['block_size'])
+    index._prepare()
+    return index
+
@@ -0,0 +1,308 @@
+"""Compressed, indexed snapshots of the scraped foods.
+
+A snapshot stores one JSON line per food, like the old data/foods.txt. The
+lines are grouped into frames of up to FRAME_SIZE foods, and each frame
+is compressed on its own: a gzip member, or a zstd frame for .zst paths,
+which needs the zstandard package. Concatenated frames are still a
+valid .gz/.zst file, so `zcat data/foods.jsonl.gz` prints the plain
+JSONL. The sidecar index (<path>.idx) holds the offset and length of
+every frame and the frame and line of every food code. Reading one food
+only decompresses its frame, and a missing or stale index is rebuilt by
+scanning the frames.
+"""
+import gzip
+import io
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SNAPSHOT_PATH = "data/foods.jsonl.gz"
+INDEX_SUFFIX = ".idx"
+FRAME_SIZE = 64
+
+
+def codec_for(path):
+    """Compression used for a path: zstd for .zst files, gzip otherwise"""
+    return 'zstd' if path.endswith('.zst') else 'gzip'
+
+
+def is_snapshot(path):
+    return path.endswith('.gz') or path.endswith('.zst')
+
+
+def _zstd():
+    if zstandard is None:
+        raise ImportError("zstandard is required for .zst snapshots (pip install zstandard)")
+    return zstandard
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return _zstd().ZstdCompressor(level=6).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress(data, codec):
+    """Decompresses one frame or several consecutive ones"""
+    if codec == 'zstd':
+        return _zstd().ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+    return gzip.decompress(data)
+
+
+def scan_frames(data, codec):
+    """Yields (offset, length, decompressed lines) of every complete frame in data"""
+    offset = 0
+    while offset < len(data):
+        decompressor = _zstd().ZstdDecompressor().decompressobj() if codec == 'zstd' else zlib.decompressobj(31)
+        try:
+            payload = decompressor.decompress(data[offset:])
+        except Exception as e:
+            print(f"Stopping at a corrupt frame at offset {offset}: {e}")
+            return
+        if not decompressor.eof:
+            # A frame cut short, e.g. by an interrupted write
+            return
+        length = len(data) - offset - len(decompressor.unused_data)
+        yield offset, length, payload.splitlines()
+        offset += length
+
+
+def line_code(line):
+    return json.loads(line)['code']
+
+
+def build_index(path, codec):
+    """Rebuilds the index of a snapshot by decompressing all of its frames"""
+    with open(path, "rb") as file:
+        data = file.read()
+    frames = []
+    foods = {}
+    for offset, length, lines in scan_frames(data, codec):
+        for line_number, line in enumerate(lines):
+            foods[line_code(line)] = [len(frames), line_number]
+        frames.append([offset, length, len(lines)])
+    return {'codec': codec, 'size': len(data), 'frames': frames, 'foods': foods}
+
+
+class SnapshotWriter:
+    """Writes a snapshot through one buffered handle and publishes it atomically.
+
+    Frames are appended to <path>.tmp, and close() writes the index and
+    renames both files into place, so readers only ever see complete
+    snapshots. Each code is stored once. Writing a code again points the
+    index at the new copy, and readers skip the stale line. With
+    carry_over=True (delta and resumed runs, and runs where foods or
+    listing pages failed), close() also copies the foods of the previous
+    snapshot that were not written again, so the published snapshot is
+    still complete.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, frame_size=FRAME_SIZE, carry_over=False):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.codec = codec_for(path)
+        self.frame_size = frame_size
+        self.carry_over = carry_over
+        self.file = None
+        self.frames = []
+        self.foods = {}
+        self.pending = []
+
+    def open(self, offset=None):
+        """Starts a new temporary file, or continues the one of an interrupted run truncated to offset"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.frames = []
+        self.foods = {}
+        self.pending = []
+        if offset is None or not os.path.exists(self.temp_path):
+            self.file = open(self.temp_path, "wb")
+        else:
+            with open(self.temp_path, "rb") as file:
+                data = file.read(offset)
+            end = 0
+            for frame_offset, length, lines in scan_frames(data, self.codec):
+                for line_number, line in enumerate(lines):
+                    self.foods[line_code(line)] = [len(self.frames), line_number]
+                self.frames.append([frame_offset, length, len(lines)])
+                end = frame_offset + length
+            self.file = open(self.temp_path, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+        if offset is not None:
+            # A resumed run skips the foods it already did, so they must come from the earlier output
+            self.carry_over = True
+        return self
+
+    def write(self, food_json):
+        """Queues a food, compressing the frame once it is full"""
+        self.write_line(food_json['code'], json.dumps(food_json, ensure_ascii=False).encode('utf-8'))
+
+    def write_line(self, code, line):
+        self.pending.append((code, line))
+        if len(self.pending) >= self.frame_size:
+            self.write_frame()
+
+    def write_frame(self):
+        if not self.pending:
+            return
+        data = compress(b"\n".join(line for _, line in self.pending) + b"\n", self.codec)
+        offset = self.file.tell()
+        self.file.write(data)
+        for line_number, (code, _) in enumerate(self.pending):
+            self.foods[code] = [len(self.frames), line_number]
+        self.frames.append([offset, len(data), len(self.pending)])
+        self.pending = []
+
+    def flush(self):
+        """Writes the pending foods as a frame and returns the size of the temporary file"""
+        self.write_frame()
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self, keep=None):
+        """Publishes the snapshot and its index; returns the number of foods in it.
+
+        keep limits the foods carried over to those codes, e.g. the ones
+        still listed, so foods removed from the source are dropped.
+        """
+        if self.carry_over and os.path.exists(self.path):
+            written = set(self.foods) | {code for code, _ in self.pending}
+            with Snapshot(self.path) as previous:
+                for code, line in previous.items():
+                    if code not in written and (keep is None or code in keep):
+                        self.write_line(code, line)
+        self.write_frame()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        self.file = None
+
+        index_path = self.path + INDEX_SUFFIX
+        with open(index_path + ".tmp", "w", encoding='utf-8') as file:
+            json.dump({'codec': self.codec, 'size': size, 'frames': self.frames, 'foods': self.foods}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        # A reader that opens the files between the two renames sees a size mismatch and rescans
+        os.replace(self.temp_path, self.path)
+        os.replace(index_path + ".tmp", index_path)
+        return len(self.foods)
+
+
+class Snapshot:
+    """Reads a published snapshot: streaming iteration in file order and lookups by code"""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.codec = codec_for(path)
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        index = None
+        try:
+            with open(path + INDEX_SUFFIX, "r", encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if index is None or index['size'] != size or index['codec'] != self.codec:
+            index = build_index(path, self.codec)
+        self.frames = index['frames']
+        self.foods = index['foods']
+        self.cached_frame = None
+        self.cached_lines = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self):
+        return len(self.foods)
+
+    def __contains__(self, code):
+        return code in self.foods
+
+    def codes(self):
+        return list(self.foods)
+
+    def frame_lines(self, frame):
+        """Returns the decompressed lines of one frame"""
+        if frame != self.cached_frame:
+            offset, length, _ = self.frames[frame]
+            self.file.seek(offset)
+            self.cached_lines = decompress(self.file.read(length), self.codec).splitlines()
+            self.cached_frame = frame
+        return self.cached_lines
+
+    def get(self, code, default=None):
+        """Returns the food with a code, decompressing only its frame"""
+        position = self.foods.get(code)
+        if position is None:
+            return default
+        return json.loads(self.frame_lines(position[0])[position[1]])
+
+    def items(self):
+        """Yields (code, JSON line) of every food in file order, one frame in memory at a time"""
+        live = [[] for _ in self.frames]
+        for code, (frame, line_number) in self.foods.items():
+            live[frame].append((line_number, code))
+        for frame, entries in enumerate(live):
+            if not entries:
+                continue
+            lines = self.frame_lines(frame)
+            for line_number, code in sorted(entries):
+                yield code, lines[line_number]
+
+    def lines(self):
+        for _, line in self.items():
+            yield line
+
+    def __iter__(self):
+        for line in self.lines():
+            yield json.loads(line)
+
+
+def iter_lines(path):
+    """Yields the JSON line of every food of a snapshot, or of every line of a legacy JSONL dump"""
+    if is_snapshot(path):
+        with Snapshot(path) as snapshot:
+            yield from snapshot.lines()
+        return
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+def snapshot_from_jsonl(source="data/foods.txt", path=SNAPSHOT_PATH, frame_size=FRAME_SIZE):
+    """Converts a legacy append-only JSONL dump into a snapshot; the last line of each code wins"""
+    foods = {}
+    skipped = 0
+    for line in iter_lines(source):
+        try:
+            code = line_code(line)
+        except (ValueError, KeyError) as e:
+            skipped += 1
+            print(f"Error processing line: {e}")
+            continue
+        # Keep the position of the last copy, like appending it again would
+        foods.pop(code, None)
+        foods[code] = line.rstrip(b"\r\n")
+    writer = SnapshotWriter(path, frame_size).open()
+    for code, line in foods.items():
+        writer.write_line(code, line)
+    count = writer.close()
+    print(f"Wrote {count} foods to {path} ({skipped} unreadable lines skipped)")
+    return count
+
+
+if __name__ == "__main__":
+    snapshot_from_jsonl()
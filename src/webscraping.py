@@ -1,110 +1,122 @@
+import hashlib
 import json
-import requests
-from bs4 import BeautifulSoup
+import os
+from bulk_loader import BulkLoader
+from checkpoint import DatabaseCheckpoint, FileCheckpoint
 from dbconnect import postgresql_connection
+from extractors import get_extractor
+from fetcher import HTTPClient, HostRateLimiter, fetch_concurrently, fetch_pipelined
+from metrics import Metrics, SampledProfiler, profiled, timed
+from nutrients import INSERT_VARIATION_NUTRIENTS, normalize, process_description
+from parallel_loader import load_file_parallel
+from read_model import refresh_read_model
+from snapshot import SNAPSHOT_PATH, SnapshotWriter, is_snapshot, iter_lines
 
 class TBCAProcessor:
-    def __init__(self, file_path="data/foods.txt"):
+    def __init__(self, file_path=SNAPSHOT_PATH):
         self.file_path = file_path
         
     def process_description(self, description):
         """Processes description, extracting main part and observations"""
-        parts = description.split(",")
-        main_part = parts[0].strip()
-        observations = [part.strip().replace("s/", "without").replace("c/", "with") for part in parts[1:]]
-        observations_line = ", ".join(observations) if observations else main_part
-        return main_part, observations_line
+        return process_description(description)
     
     def save_to_file(self, food_json):
-        """Saves data to the TXT file"""
-        import os
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        with open(self.file_path, "a", encoding='utf-8') as file:
-            product_json_str = json.dumps(food_json, ensure_ascii=False)
-            file.write(product_json_str + "\n")
+        """Adds (or replaces) one food in the snapshot, or appends it to a legacy JSONL file.
+
+        Every call republishes the whole snapshot, so write many foods
+        through one snapshot.SnapshotWriter instead.
+        """
+        if not is_snapshot(self.file_path):
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+            with open(self.file_path, "a", encoding='utf-8') as file:
+                file.write(json.dumps(food_json, ensure_ascii=False) + "\n")
+            return
+        writer = SnapshotWriter(self.file_path, carry_over=True).open()
+        writer.write(food_json)
+        writer.close()
+    
+    def content_hash(self, food_json):
+        """Returns a stable SHA-256 of the scraped content of a food"""
+        canonical = json.dumps(food_json, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def load_file_hashes(self):
+        """Returns {code: content hash} for the foods in the snapshot (or JSONL dump; last line wins)"""
+        hashes = {}
+        if not os.path.exists(self.file_path):
+            return hashes
+        for line in iter_lines(self.file_path):
+            try:
+                food_json = json.loads(line)
+                hashes[food_json['code']] = self.content_hash(food_json)
+            except (ValueError, KeyError):
+                continue
+        return hashes
+    
+    def delete_removed(self, cursor, listed_codes):
+        """Deletes the foods whose codes are not in listed_codes, with their variations and nutrients"""
+        cursor.execute("SELECT id FROM foods WHERE NOT (code = ANY(%s))", (list(listed_codes),))
+        food_ids = [row[0] for row in cursor.fetchall()]
+        if not food_ids:
+            return 0
+        cursor.execute("SELECT id FROM food_variations WHERE food_id = ANY(%s)", (food_ids,))
+        variation_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM food_nutrients WHERE variation_id = ANY(%s)", (variation_ids,))
+        cursor.execute("DELETE FROM food_variation_nutrients WHERE variation_id = ANY(%s)", (variation_ids,))
+        cursor.execute("DELETE FROM food_variations WHERE id = ANY(%s)", (variation_ids,))
+        cursor.execute("DELETE FROM foods WHERE id = ANY(%s)", (food_ids,))
+        return len(food_ids)
+    
+    def load_db_hashes(self, cursor):
+        """Returns {code: content hash} for the foods already in the database"""
+        cursor.execute("SELECT code, content_hash FROM foods")
+        return dict(cursor.fetchall())
+    
+    def extract_nutrients(self, food_json):
+        """Returns the legacy (component, unit, value) rows and the numeric values of a food in COLUMNS order"""
+        return normalize(food_json['nutrients'])
     
     def save_to_db(self, cursor, food_json):
-        """Saves data to the PostgreSQL database using the optimized column-based schema"""
+        """Saves data to the PostgreSQL database using the optimized column-based schema.
+
+        Saving the same food again updates its rows in place instead of
+        adding another variation with a second set of nutrients.
+        """
         try:
             main_part, observations_line = self.process_description(food_json['description'])
             
-            # Insert main food
+            # Upsert main food
             cursor.execute("""
-                INSERT INTO foods (code, name, group) 
-                VALUES (%s, %s, %s) 
-                ON CONFLICT (code) DO NOTHING
+                INSERT INTO foods (code, name, "group", content_hash) 
+                VALUES (%s, %s, %s, %s) 
+                ON CONFLICT (code) DO UPDATE
+                SET name = EXCLUDED.name, "group" = EXCLUDED."group", content_hash = EXCLUDED.content_hash
                 RETURNING id
-            """, (food_json['code'], food_json['class'], main_part))
+            """, (food_json['code'], main_part, food_json['class'], self.content_hash(food_json)))
+            
+            food_id = cursor.fetchone()[0]
             
+            # Upsert variation: each food page describes a single variation
+            cursor.execute("SELECT id FROM food_variations WHERE food_id = %s ORDER BY id LIMIT 1", (food_id,))
             result = cursor.fetchone()
             if result:
-                food_id = result[0]
+                variation_id = result[0]
+                cursor.execute("UPDATE food_variations SET description = %s WHERE id = %s",
+                               (observations_line, variation_id))
+                cursor.execute("DELETE FROM food_nutrients WHERE variation_id = %s", (variation_id,))
+                cursor.execute("DELETE FROM food_variation_nutrients WHERE variation_id = %s", (variation_id,))
             else:
-                cursor.execute("SELECT id FROM foods WHERE code = %s", 
-                                (food_json['code'],))
-                food_id = cursor.fetchone()[0]
-            
-            # Insert variation
-            cursor.execute("""
-                INSERT INTO food_variations (food_id, description) 
-                VALUES (%s, %s) 
-                RETURNING id
-            """, (food_id, observations_line))
-            
-            variation_id = cursor.fetchone()[0]
-            
-            # Create a mapping of nutrient components to database columns
-            nutrient_column_map = {
-                "Energia": "energia_kj" if "kJ" in str(food_json['nutrients']) else "energia_kcal",
-                "Umidade": "umidade_g",
-                "Carboidrato total": "carboidrato_total_g",
-                "Carboidrato disponível": "carboidrato_disponivel_g",
-                "Proteína": "proteina_g",
-                "Lipídios": "lipidios_g",
-                "Fibra alimentar": "fibra_alimentar_g",
-                "Álcool": "alcool_g",
-                "Cinzas": "cinzas_g",
-                "Colesterol": "colesterol_mg",
-                "Ácidos graxos saturados": "acidos_graxos_saturados_g",
-                "Ácidos graxos monoinsaturados": "acidos_graxos_monoinsaturados_g",
-                "Ácidos graxos poliinsaturados": "acidos_graxos_poliinsaturados_g",
-                "Ácidos graxos trans": "acidos_graxos_trans_g",
-                "Cálcio": "calcio_mg",
-                "Ferro": "ferro_mg",
-                "Sódio": "sodio_mg",
-                "Magnésio": "magnesio_mg",
-                "Fósforo": "fosforo_mg",
-                "Potássio": "potassio_mg",
-                "Manganês": "manganes_mg",
-                "Zinco": "zinco_mg",
-                "Cobre": "cobre_mg",
-                "Selênio": "selenio_mcg",
-                "Vitamina A (RE)": "vitamina_a_re_mcg",
-                "Vitamina A (RAE)": "vitamina_a_rae_mcg",
-                "Vitamina D": "vitamina_d_mcg",
-                "Alfa-tocoferol (Vitamina E)": "alfa_tocoferol_mg",
-                "Tiamina": "tiamina_mg",
-                "Riboflavina": "riboflavina_mg",
-                "Niacina": "niacina_mg",
-                "Vitamina B6": "vitamina_b6_mg",
-                "Vitamina B12": "vitamina_b12_mcg",
-                "Vitamina C": "vitamina_c_mg",
-                "Equivalente de folato": "equivalente_folato_mcg",
-                "Sal de adição": "sal_de_adicao_g",
-                "Açúcar de adição": "acucar_de_adicao_g"
-            }
+                cursor.execute("""
+                    INSERT INTO food_variations (food_id, description) 
+                    VALUES (%s, %s) 
+                    RETURNING id
+                """, (food_id, observations_line))
+                variation_id = cursor.fetchone()[0]
             
-            # Dictionary to store nutrient values for the column-based approach
-            nutrient_values = {"variation_id": variation_id}
+            legacy_rows, nutrient_values = self.extract_nutrients(food_json)
             
             # Also insert into the legacy table for backward compatibility
-            for nutrient in food_json['nutrients']:
-                # Ensure all values are truncated to appropriate lengths
-                component = nutrient.get('Component', '')[:499]  # Truncate to fit VARCHAR(500)
-                unit = nutrient.get('Units', '')[:99]           # Truncate to fit VARCHAR(100)
-                value = nutrient.get('Value per 100g', '')[:99]  # Truncate to fit VARCHAR(100)
-                
-                # Insert into legacy table
+            for component, unit, value in legacy_rows:
                 cursor.execute("""
                     INSERT INTO food_nutrients 
                     (variation_id, component, unit_of_measurement, value_per_100g) 
@@ -115,31 +127,8 @@ class TBCAProcessor:
                     unit,
                     value
                 ))
-                
-                # Populate the dictionary for the column-based approach
-                column_name = nutrient_column_map.get(component)
-                if column_name:
-                    # Convert value to numeric if possible
-                    try:
-                        numeric_value = float(value.replace(',', '.')) if value and value not in ("NA", "") else None
-                    except (ValueError, AttributeError):
-                        numeric_value = None
-                        
-                    nutrient_values[column_name] = numeric_value
             
-            # Build the dynamic SQL for the column-based table
-            if nutrient_values:
-                columns = list(nutrient_values.keys())
-                placeholders = ['%s'] * len(columns)
-                values = [nutrient_values[col] for col in columns]
-                
-                query = f"""
-                    INSERT INTO food_variation_nutrients 
-                    ({', '.join(columns)}) 
-                    VALUES ({', '.join(placeholders)})
-                """
-                
-                cursor.execute(query, values)
+            cursor.execute(INSERT_VARIATION_NUTRIENTS, [variation_id] + nutrient_values)
                 
         except Exception as e:
             # Log the error but don't stop processing
@@ -151,149 +140,380 @@ class TBCAProcessor:
             
         return True
 
-def run_webscraping(save_to_file=True, save_to_db=True):
-    processor = TBCAProcessor()
+BASE_URL = 'https://www.tbca.net.br/base-dados/composicao_alimentos.php'
+
+def fetch_food(client, extractor, food_code, food_class, base_url=BASE_URL, metrics=None):
+    """Downloads and parses the detail page of a single food"""
+    with timed(metrics, 'detail_fetch'):
+        response = client.get(base_url, params={'codigo_alimento': food_code})
+    with timed(metrics, 'parse'):
+        return extractor.parse_food_page(response.content, food_code, food_class)
+
+def fetch_listing_page(client, extractor, page, base_url=BASE_URL, metrics=None):
+    """Downloads and parses one listing page.
+
+    Returns the (food_code, food_class) tuples on the page, whether a next
+    page exists and the highest page number linked from the pagination
+    (None when the page count cannot be determined).
+    """
+    with timed(metrics, 'listing_fetch'):
+        response = client.get(base_url, params={'page': page})
+    with timed(metrics, 'listing_parse'):
+        return extractor.parse_listing_page(response.content)
+
+def crawl_listing(client, extractor, base_url=BASE_URL, workers=1, checkpoint=None, metrics=None):
+    """Yields (food_code, food_class) tuples as each listing page is parsed.
+
+    Pages up to the highest one linked from the pagination are downloaded
+    in parallel, and the crawl goes on from there while that page still
+    links "próxima »"; without page links it follows "próxima »" one
+    page at a time. Pages already stored in the checkpoint are not
+    downloaded again, and newly parsed pages are recorded in it.
+    """
+    def listing_page(page):
+        result = checkpoint.get_page(page) if checkpoint else None
+        if result is None:
+            result = fetch_listing_page(client, extractor, page, base_url, metrics)
+            if checkpoint:
+                checkpoint.record_page(page, result)
+        return result
     
-    base_url = 'https://www.tbca.net.br/base-dados/composicao_alimentos.php'
-    food_codes = []
-    params = {'page': 1}
+    page = 1
+    try:
+        food_codes, has_next, last_page = listing_page(page)
+    except Exception as e:
+        print(f"Error processing page {page}: {e}")
+        if checkpoint:
+            checkpoint.listing_errors += 1
+        return
+    yield from food_codes
+
+    while has_next:
+        if last_page and last_page > page:
+            # The pagination may only link a window of pages, so the
+            # listing ends only at a page without "próxima »"
+            window = range(page + 1, last_page + 1)
+            has_next, last_page = False, None
+            results = fetch_concurrently(window, listing_page, workers=workers, ordered=True)
+            for page, result, error in results:
+                if error:
+                    print(f"Error processing page {page}: {error}")
+                    if checkpoint:
+                        checkpoint.listing_errors += 1
+                    continue
+                yield from result[0]
+                if page == window[-1]:
+                    _, has_next, last_page = result
+            page = window[-1]
+            continue
+
+        page += 1
+        try:
+            food_codes, has_next, last_page = listing_page(page)
+        except Exception as e:
+            print(f"Error processing page {page}: {e}")
+            if checkpoint:
+                checkpoint.listing_errors += 1
+            break
+        yield from food_codes
+
+def run_webscraping(save_to_file=True, save_to_db=True, workers=1, rate_limit=None,
+                    ordered=True, base_url=BASE_URL, timeout=(10, 30), max_retries=5, parser='auto',
+                    cache=None, offline=False, delta=False, batch_size=500, resume=True,
+                    report_path="data/run_report.json", metrics_port=None, profile_sample=0.0):
+    """Scrapes every food from TBCA.
+
+    The listing crawl and the detail downloads run as a pipeline: detail
+    pages start downloading as soon as the first listing page is parsed.
+    workers sets how many pages are downloaded in parallel and rate_limit
+    caps the requests per second sent to each host. Results are written to
+    the sinks in listing order unless ordered=False.
+
+    All requests share one keep-alive connection pool. Connection errors,
+    timeouts, 429 and 5xx responses are retried up to max_retries times
+    with jittered exponential backoff.
+
+    parser selects the HTML extractor ('lxml', 'html.parser' or 'auto',
+    which uses lxml when it is installed).
+
+    The file sink is a compressed snapshot (data/foods.jsonl.gz, see
+    snapshot.SnapshotWriter). It is written to a temporary file and
+    replaces the previous snapshot atomically at the end of the run, so
+    every food appears once. When the whole listing was crawled, foods
+    that are no longer listed are left out of the snapshot and deleted
+    from the database, in delta and full runs alike.
+
+    cache is an optional http_cache.ResponseCache. With offline=True every
+    page is replayed from that cache without touching the network, which
+    rebuilds the file and the database from a previous run.
+
+    With delta=True the scraped foods are compared with the content hashes
+    already stored in the enabled sinks (the foods table and/or the
+    snapshot) and only new or changed foods are written; unchanged foods
+    are carried over into the new snapshot. Combine it with a
+    cache so unchanged detail pages are revalidated with a 304 instead of
+    being downloaded again. The run reports how many foods were added,
+    changed, unchanged and removed from the listing.
+
+    Database writes are buffered and committed batch_size foods at a time.
+    Every commit also records a checkpoint (the scrape_checkpoint table, or
+    data/scrape_checkpoint.json when the database is not used) holding the
+    parsed listing pages, the completed codes and the size of the snapshot
+    being written. With resume=True an interrupted run continues from its
+    last commit: that file is truncated back to that size, parsed listing pages are
+    reused and completed foods are skipped. The checkpoint is removed
+    once a run finishes without errors. A run that finishes with errors
+    marks it as finished instead, so the next run does a fresh crawl,
+    which picks up foods added since and retries the failed ones; their
+    previous copy is kept in the snapshot meanwhile.
+
+    Every stage (listing fetch and parse, detail fetch, parse, normalize,
+    file write, database write and commit) is timed into a
+    metrics.Metrics, which is written with the HTTP, byte and error
+    counters to report_path as a JSON run report at the end (None skips
+    it). metrics_port serves the same metrics in the Prometheus text
+    format at /metrics while the run is going on. profile_sample profiles
+    that fraction of the foods with cProfile, from download to database
+    write, and dumps the merged profile to data/profile.prof.
+    """
+    metrics = Metrics()
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    profiler = SampledProfiler(profile_sample) if profile_sample else None
+
+    processor = TBCAProcessor()
+    extractor = get_extractor(parser)
+    rate_limiter = HostRateLimiter(rate_limit) if rate_limit else None
+    # The listing crawl and the detail workers may each have `workers` requests in flight
+    client = HTTPClient(pool_size=2 * max(workers, 1), timeout=timeout, max_retries=max_retries,
+                        rate_limiter=rate_limiter, cache=cache, offline=offline)
+    metrics.watch(client.stats)
     
-    conn = cursor = None
+    conn = cursor = loader = page_conn = None
+    snapshot = SnapshotWriter(processor.file_path, carry_over=delta) if save_to_file else None
     if save_to_db:
         conn = postgresql_connection()
-        cursor = conn.cursor()
+        page_conn = postgresql_connection()
+        checkpoint = DatabaseCheckpoint(conn, page_conn, snapshot)
+        loader = BulkLoader(conn, processor, batch_size, on_commit=checkpoint.commit, metrics=metrics)
+    else:
+        checkpoint = FileCheckpoint(output=snapshot)
     
-    print("Collecting food codes...")
+    if checkpoint.start(resume):
+        print(f"Resuming interrupted run: {len(checkpoint.completed)} foods already done, "
+              f"{len(checkpoint.pages)} listing pages already parsed")
+    completed_codes = set(checkpoint.completed)
     
-    while True:
-        try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Search for food links on the page
-            food_links = soup.find_all('a', href=lambda x: x and 'int_composicao_alimentos.php?cod_produto=' in x)
-            
-            for link in food_links:
-                href = link.get('href')
-                food_code = href.split('cod_produto=')[1].split('&')[0]
-                # Extract food class (if available in context)
-                food_class = link.find_parent('tr').find_all('td')[3].get_text().strip()
-                food_codes.append((food_code, food_class))
-
-            # Find the link to the next page
-            next_page_link = soup.find('a', string='próxima »')
-            
-            # If there is a next page, get the URL and continue the loop
-            if next_page_link:
-                params['page'] += 1
-            else:
-                break
-            
-        except Exception as e:
-            print(f"Error processing page {params['page']}: {e}")
-            break
+    if save_to_db:
+        cursor = conn.cursor()
     
-    print(f"Total foods collected: {len(food_codes)}")
+    known_file_hashes = known_db_hashes = {}
+    if delta:
+        if save_to_file:
+            known_file_hashes = processor.load_file_hashes()
+        if save_to_db:
+            known_db_hashes = processor.load_db_hashes(cursor)
+        print(f"Delta mode: {len(set(known_file_hashes) | set(known_db_hashes))} foods already stored")
+    delta_counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+    seen_codes = set(completed_codes)
+    
+    print("Collecting food codes and fetching foods...")
     
     # Process each food
-    success_count = 0
-    for i, (food_code, food_class) in enumerate(food_codes):
+    total_count = 0
+    error_count = 0
+    work_queue = (
+        item for item in crawl_listing(client, extractor, base_url, workers, checkpoint, metrics)
+        if item[0] not in completed_codes
+    )
+    
+    def fetch(item):
+        with profiled(profiler, item[0]):
+            return fetch_food(client, extractor, item[0], item[1], base_url, metrics)
+    
+    results = fetch_pipelined(
+        work_queue,
+        fetch,
+        workers=workers,
+        ordered=ordered
+    )
+    for (food_code, food_class), food_json, error in results:
+        total_count += 1
+        metrics.increment('foods_processed')
+        seen_codes.add(food_code)
+        if error:
+            error_count += 1
+            metrics.increment('foods_failed')
+            print(f"Error processing {food_code}: {error}")
+            continue
         try:
-            # Make request to individual food page
-            food_url = f"{base_url}?codigo_alimento={food_code}"
-            response = requests.get(food_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract food description
-            description = "Description not found"
-            description_elem = soup.find('h2') or soup.find('h1') or soup.find('title')
-            if description_elem:
-                description = description_elem.get_text().strip()
-            
-            # Extract nutrients table
-            nutrients = []
-            table = soup.find('table')
-            if table:
-                rows = table.find_all('tr')[1:]  # Skip header
-                for row in rows:
-                    columns = row.find_all('td')
-                    if len(columns) >= 3:
-                        nutrient = {
-                            'Component': columns[0].get_text().strip(),
-                            'Units': columns[1].get_text().strip(),
-                            'Value per 100g': columns[2].get_text().strip()
-                        }
-                        nutrients.append(nutrient)
+            write_file, write_db = save_to_file, save_to_db
+            if delta:
+                food_hash = processor.content_hash(food_json)
+                write_file = save_to_file and known_file_hashes.get(food_code) != food_hash
+                write_db = save_to_db and known_db_hashes.get(food_code) != food_hash
+                if food_code not in known_file_hashes and food_code not in known_db_hashes:
+                    delta_counts['added'] += 1
+                elif write_file or write_db:
+                    delta_counts['changed'] += 1
+                else:
+                    delta_counts['unchanged'] += 1
             
-            food_json = {
-                'code': food_code,
-                'class': food_class,
-                'description': description,
-                'nutrients': nutrients
-            }
-            
-            if save_to_file:
-                processor.save_to_file(food_json)
+            with profiled(profiler, food_code):
+                if write_file:
+                    with timed(metrics, 'file_write'):
+                        snapshot.write(food_json)
+                checkpoint.mark_done(food_code)
+                
+                if save_to_db and write_db:
+                    loader.add(food_json)
             
             if save_to_db:
-                success = processor.save_to_db(cursor, food_json)
-                if success:
-                    success_count += 1
-                
-                # Periodic commit
-                if (i + 1) % 10 == 0:
-                    conn.commit()
-                    print(f"Processed {i + 1} foods, successfully saved {success_count}...")
+                if total_count % 10 == 0:
+                    print(f"Processed {total_count} foods, successfully saved {loader.saved_count}...")
+                    
+            # Checkpoint foods that never reach the loader (e.g. unchanged in delta mode)
+            if len(checkpoint.pending) >= batch_size and not (loader and loader.pending):
+                checkpoint.commit()
                     
         except Exception as e:
+            error_count += 1
+            metrics.increment('foods_failed')
             print(f"Error processing {food_code}: {e}")
     
     # Finalizing
+    success_count = 0
+    # A complete listing tells which stored foods were removed from TBCA
+    listed_codes = None if checkpoint.listing_errors else seen_codes
+    removed_count = 0
     if save_to_db:
-        conn.commit()
+        loader.flush()
+        success_count = loader.saved_count
+        if listed_codes:
+            removed_count = processor.delete_removed(cursor, listed_codes)
+            conn.commit()
+    checkpoint.commit()
+    if snapshot:
+        if error_count or checkpoint.listing_errors:
+            # Keep the previous copy of foods this run could not download
+            snapshot.carry_over = True
+        with timed(metrics, 'file_write'):
+            published = snapshot.close(listed_codes)
+        print(f"Snapshot of {published} foods published to {snapshot.path}")
+    db_failed = loader.failed_count if save_to_db else 0
+    if error_count or db_failed or checkpoint.listing_errors:
+        print(f"{error_count} foods, {db_failed} database writes and {checkpoint.listing_errors} listing pages "
+              f"failed; the next run crawls again and retries them.")
+        checkpoint.finish()
+    else:
+        checkpoint.clear()
+    if save_to_db:
+        with timed(metrics, 'refresh'):
+            refresh_read_model(conn)
         cursor.close()
         conn.close()
+        page_conn.close()
     
-    print(f"Web scraping finished! Successfully saved {success_count} out of {len(food_codes)} foods.")
+    stats = client.stats()
+    metrics.unwatch(client.stats)
+    client.close()
+    metrics.update({'foods_saved': success_count, 'foods_removed': removed_count,
+                    'listing_errors': checkpoint.listing_errors})
+    if delta:
+        delta_counts['removed'] = len((set(known_file_hashes) | set(known_db_hashes)) - seen_codes)
+        metrics.update({f"delta_{name}": count for name, count in delta_counts.items()})
+    print(f"Web scraping finished! Successfully saved {success_count} out of {total_count} foods.")
+    if removed_count:
+        print(f"Deleted {removed_count} foods that are no longer listed from the database.")
+    print(f"HTTP: {stats['requests']} requests, {stats['retries']} retries, {stats['failures']} failures, "
+          f"{stats['connections_opened']} connections opened, {stats['connections_reused']} reused.")
+    if cache:
+        print(f"Cache: {stats['cache_hits']} hits, {stats['cache_revalidated']} revalidated, "
+              f"{stats['cache_misses']} misses.")
+    if delta:
+        print(f"Delta: {delta_counts['added']} added, {delta_counts['changed']} changed, "
+              f"{delta_counts['unchanged']} unchanged, {delta_counts['removed']} removed.")
+    finish_metrics(metrics, report_path, profiler)
+
+def finish_metrics(metrics, report_path, profiler=None):
+    """Prints the time spent per stage, writes the run report and the profile and stops the endpoint"""
+    report = metrics.report()
+    print(f"Throughput: {report['foods_per_second']} foods/s over {report['elapsed_seconds']} s.")
+    for stage, summary in report['stages'].items():
+        print(f"  {stage}: {summary['count']} x, {summary['total_seconds']:.3f} s total, "
+              f"p50 {summary['p50_seconds'] * 1000:.1f} ms, p95 {summary['p95_seconds'] * 1000:.1f} ms, "
+              f"max {summary['max_seconds'] * 1000:.1f} ms")
+    if report_path:
+        print(f"Run report written to {metrics.write_report(report_path)}")
+    if profiler:
+        path = profiler.dump()
+        if path:
+            print(f"Profile of {len(profiler.samples)} sampled foods written to {path}")
+    metrics.close()
 
-def process_existing_file():
-    """Processes existing TXT file into the database"""
+def process_existing_file(batch_size=500, workers=1, writers=1, report_path="data/load_report.json",
+                          metrics_port=None, path=None):
+    """Processes the snapshot into the database, committing batch_size foods at a time.
+
+    path defaults to the snapshot written by run_webscraping; a legacy
+    JSONL dump such as data/foods.txt is read too.
+
+    With workers or writers above 1 the file is parsed by a pool of
+    processes and written through several database connections
+    (see parallel_loader.load_file_parallel). Stage timings and counters
+    are written to report_path and optionally served on metrics_port, as
+    in run_webscraping.
+    """
     processor = TBCAProcessor()
+    path = path or processor.file_path
+    metrics = Metrics()
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    if workers > 1 or writers > 1:
+        saved, failed, errors = load_file_parallel(processor, path, batch_size, workers, writers,
+                                                   metrics=metrics)
+        print(f"File processing finished! Successfully saved {saved} foods "
+              f"({failed} failed, {errors} unreadable lines).")
+        conn = postgresql_connection()
+        with timed(metrics, 'refresh'):
+            refresh_read_model(conn)
+        conn.close()
+        metrics.update({'foods_saved': saved, 'foods_failed': failed + errors})
+        finish_metrics(metrics, report_path)
+        return
+    
     conn = postgresql_connection()
-    cursor = conn.cursor()
+    loader = BulkLoader(conn, processor, batch_size, metrics=metrics)
     
-    success_count = 0
     total_count = 0
     
     try:
-        with open(processor.file_path, "r", encoding='utf-8') as file:
-            for line in file:
-                if line.strip():
-                    total_count += 1
-                    try:
-                        food_json = json.loads(line.strip())
-                        success = processor.save_to_db(cursor, food_json)
-                        if success:
-                            success_count += 1
-                            
-                        # Periodic commit
-                        if total_count % 10 == 0:
-                            conn.commit()
-                            print(f"Processed {total_count} foods, successfully saved {success_count}...")
-                            
-                    except Exception as e:
-                        print(f"Error processing line: {e}")
-                        # Continue with the next line
+        for line in iter_lines(path):
+            total_count += 1
+            metrics.increment('foods_processed')
+            try:
+                with timed(metrics, 'parse'):
+                    food_json = json.loads(line)
+                loader.add(food_json)
+                
+                if total_count % 10 == 0:
+                    print(f"Processed {total_count} foods, successfully saved {loader.saved_count}...")
+                    
+            except Exception as e:
+                metrics.increment('foods_failed')
+                print(f"Error processing line: {e}")
+                # Continue with the next line
         
-        conn.commit()
-        print(f"File processing finished! Successfully saved {success_count} out of {total_count} foods.")
+        loader.flush()
+        print(f"File processing finished! Successfully saved {loader.saved_count} out of {total_count} foods.")
+        with timed(metrics, 'refresh'):
+            refresh_read_model(conn)
     except Exception as e:
         print(f"Error opening or processing the file: {e}")
     finally:
-        cursor.close()
         conn.close()
+        metrics.update({'foods_saved': loader.saved_count, 'db_failed': loader.failed_count})
+        finish_metrics(metrics, report_path)
 
 if __name__ == "__main__":
     # To run a full scrape
@@ -0,0 +1,71 @@
+"""Parity of the HTML extractors on saved TBCA-style pages.
+
+tests/corpus holds detail pages (<food_code>.html) and listing pages
+(listing_<n>.html) with the quirks of the site's markup: ISO-8859-1 and
+windows-1252 bytes, pages without a charset, a UTF-8 byte order mark,
+entities, markup inside cells and windowed pagination.
+expected.json is the output of the html.parser reference for each page,
+and every extractor must reproduce it exactly.
+
+    python -m pytest tests
+"""
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from extractors import EXTRACTORS
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+PAGES = sorted(os.path.splitext(os.path.basename(path))[0]
+               for path in glob.glob(os.path.join(CORPUS_DIR, "*.html")))
+
+with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as file:
+    EXPECTED = json.load(file)
+
+
+@pytest.fixture(params=sorted(EXTRACTORS))
+def extractor(request):
+    try:
+        return EXTRACTORS[request.param]()
+    except ImportError as e:
+        pytest.skip(str(e))
+
+
+def read_page(name):
+    with open(os.path.join(CORPUS_DIR, name + ".html"), "rb") as file:
+        return file.read()
+
+
+def test_every_page_has_an_expected_result():
+    assert PAGES and sorted(EXPECTED) == PAGES
+
+
+@pytest.mark.parametrize("name", [name for name in PAGES if not name.startswith("listing")])
+def test_detail_page(extractor, name):
+    assert extractor.parse_food_page(read_page(name), name, "Grupo") == EXPECTED[name]
+
+
+@pytest.mark.parametrize("name", [name for name in PAGES if name.startswith("listing")])
+def test_listing_page(extractor, name):
+    food_codes, has_next, last_page = extractor.parse_listing_page(read_page(name))
+    assert {"food_codes": [list(item) for item in food_codes], "has_next": has_next,
+            "last_page": last_page} == EXPECTED[name]
+
+
+def test_parity_on_mock_pages_and_edge_cases():
+    from bench_extractors import check_parity, load_corpus
+
+    extractors = {}
+    for name, extractor_class in EXTRACTORS.items():
+        try:
+            extractors[name] = extractor_class()
+        except ImportError:
+            continue
+    details, listings = load_corpus(None)
+    assert check_parity(extractors, details, listings) == 0